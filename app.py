@@ -1,46 +1,42 @@
-from flask import Flask, render_template, request, redirect, session, flash, jsonify 
+from flask import Flask, render_template, request, redirect, session, flash, jsonify, Response, stream_with_context, make_response
 from markupsafe import Markup
 import sqlite3
-import requests
 import random
 import json
 import os   
-from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-import pandas as pd
-import joblib
-import numpy as np
+import time
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
 import warnings
+from question_bank import QuestionBank
+from question_scheduler import QuestionScheduler
+import leetcode_store
+import db
+import migrations
+import auth
+import user_stats
+import quiz_engine
+from ingest import IngestQueue
+from insights_cache import CACHE_EVENTS, InsightsCache, backend_from_url
+import feedback
+from render_cache import RenderCache
+from instrumentation import Instrumentation
+from content_store import store as content_store
+import session_store
+import notes_store
+from db import get_db
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
-
-# Sample formulas dictionary
-aptitude_formulas = {
-    "time-and-work": """
-        <ul>
-            <li>If A can do a piece of work in n days, then A's 1 day work = 1/n</li>
-            <li>If A is n times as good a worker as B, then ratio of work = A:B = n:1</li>
-            <li>Total work = Work rate × Time</li>
-        </ul>
-    """,
-    "profit-and-loss": """
-        <ul>
-            <li>Profit = SP - CP</li>
-            <li>Loss = CP - SP</li>
-            <li>Profit % = (Profit / CP) × 100</li>
-            <li>Loss % = (Loss / CP) × 100</li>
-        </ul>
-    """,
-    "percentages": """
-        <ul>
-            <li>Percentage = (Value / Total Value) × 100</li>
-            <li>Increase% = ((New - Original)/Original) × 100</li>
-        </ul>
-    """,
-}
+# Sessions are stored server-side; the cookie only carries their id.
+# Set SESSION_STORE_URL=redis://... to keep them in a Redis-compatible server.
+app.session_interface = session_store.ServerSessionInterface(
+    session_store.backend_from_url(os.environ.get('SESSION_STORE_URL')))
+db.init_app(app)
+# Per-route latency, query counts and timings for /metrics, plus slow-request logs
+instrumentation = Instrumentation(app, db.pool)
+render_cache = RenderCache(app)
 
 # List of LeetCode topics supported by the API
 leetcode_topics = [
@@ -52,401 +48,100 @@ leetcode_topics = [
     "trie", "quickselect", "backtracking", "bit-manipulation"
 ]
 
-learning_materials = {
-    "Percentages": Markup("""
-        <ul>
-            <li><b>Percentage Formula:</b> (Part/Whole) × 100</li>
-            <li><b>Increase by x%:</b> Final = Initial × (1 + x/100)</li>
-            <li><b>Decrease by x%:</b> Final = Initial × (1 - x/100)</li>
-        </ul>
-    """),
-    "Time and Work": Markup("""
-        <ul>
-            <li><b>Work Formula:</b> Work = Rate × Time</li>
-            <li><b>If A can do a job in x days, A's 1-day work = 1/x</li>
-            <li><b>Combined work:</b> If A and B work together, 1/x + 1/y = 1/total</li>
-        </ul>
-    """),
-    "Profit and Loss": Markup("""
-        <ul>
-            <li><b>Profit:</b> Selling Price - Cost Price</li>
-            <li><b>Profit %:</b> (Profit / Cost Price) × 100</li>
-            <li><b>Loss %:</b> (Loss / Cost Price) × 100</li>
-        </ul>
-    """)
-}
-
-# Sample aptitude questions
-aptitude_questions = {
-    "Percentages": [
-        {
-            "question": "What is 25% of 200?",
-            "options": ["25", "50", "75", "100"],
-            "answer": "50"
-        },
-        {
-            "question": "A value increases from 80 to 100. What is the percentage increase?",
-            "options": ["20%", "25%", "30%", "40%"],
-            "answer": "25%"
-        },
-        {
-            "question": "What is 40% of 150?",
-            "options": ["50", "60", "70", "80"],
-            "answer": "60"
-        },
-        {
-            "question": "If 30% of a number is 90, what is the number?",
-            "options": ["270", "300", "280", "250"],
-            "answer": "300"
-        },
-        {
-            "question": "A man's salary is increased by 20% and then decreased by 20%. What is the net change?",
-            "options": ["4% decrease", "4% increase", "No change", "2% decrease"],
-            "answer": "4% decrease"
-        },
-        {
-            "question": "A number is first increased by 10% and then increased again by 20%. What is the overall percentage increase?",
-            "options": ["30%", "32%", "28%", "25%"],
-            "answer": "32%"
-        },
-        {
-            "question": "If 60 is 75% of a number, what is the number?",
-            "options": ["70", "75", "80", "85"],
-            "answer": "80"
-        },
-        {
-            "question": "What percentage of 1 hour is 45 minutes?",
-            "options": ["50%", "60%", "75%", "90%"],
-            "answer": "75%"
-        },
-        {
-            "question": "If a shirt is marked at ₹1200 and a discount of 25% is offered, what is the selling price?",
-            "options": ["₹800", "₹900", "₹1000", "₹950"],
-            "answer": "₹900"
-        },
-        {
-            "question": "A population increases from 20,000 to 25,000. What is the percentage increase?",
-            "options": ["20%", "25%", "30%", "15%"],
-            "answer": "25%"
-        }
-    ],
-    "Time and Work": [
-        {
-            "question": "If A can do a work in 10 days, how much work does A do in 1 day?",
-            "options": ["1/10", "10", "1/5", "None"],
-            "answer": "1/10"
-        }
-    ]
-}
-
-# ML Classes
-class PerformancePredictor:
-    def __init__(self):
-        self.model = LinearRegression()
-        self.is_trained = False
-    
-    def prepare_training_data(self, username=None):
-        """Prepare training data from database"""
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        
-        # Get historical aptitude data
-        if username:
-            query = """
-                SELECT username, topic, score, total_questions, 
-                       timestamp, COUNT(*) as attempt_count
-                FROM aptitude_progress 
-                WHERE username = ?
-                GROUP BY username, topic
-            """
-            cursor.execute(query, (username,))
-        else:
-            query = """
-                SELECT username, topic, score, total_questions, 
-                       timestamp, COUNT(*) as attempt_count
-                FROM aptitude_progress 
-                GROUP BY username, topic
-            """
-            cursor.execute(query)
-        
-        data = cursor.fetchall()
-        conn.close()
-        
-        if len(data) < 5:  # Need minimum data points
-            return None, None
-        
-        # Prepare features and targets
-        features = []
-        targets = []
-        
-        for row in data:
-            username, topic, score, total_q, timestamp, attempts = row
-            
-            # Features: [previous_score, attempts_count, topic_encoded]
-            prev_score = (score / total_q) * 100 if total_q > 0 else 0
-            topic_encoded = self.encode_topic(topic)
-            
-            features.append([prev_score, attempts, topic_encoded])
-            targets.append(prev_score)
-        
-        return np.array(features), np.array(targets)
-    
-    def encode_topic(self, topic):
-        """Simple topic encoding"""
-        topic_mapping = {
-            "Percentages": 1,
-            "Time and Work": 2, 
-            "Profit and Loss": 3
-        }
-        return topic_mapping.get(topic, 0)
-    
-    def train_model(self):
-        """Train the model with available data"""
-        X, y = self.prepare_training_data()
-        
-        if X is None:
-            return False
-        
-        try:
-            self.model.fit(X, y)
-            self.is_trained = True
-            return True
-        except:
-            return False
-    
-    def predict_performance(self, username, topic):
-        """Predict user's performance on a topic"""
-        if not self.is_trained:
-            if not self.train_model():
-                return None
-        
-        # Get user's historical data
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT AVG(score*100.0/total_questions) as avg_score,
-                   COUNT(*) as attempts
-            FROM aptitude_progress 
-            WHERE username = ?
-        """, (username,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result[0] is None:
-            return 65  # Default prediction for new users
-        
-        # Prepare prediction features
-        avg_score, attempts = result
-        topic_encoded = self.encode_topic(topic)
-        
-        features = np.array([[avg_score, attempts, topic_encoded]])
-        prediction = self.model.predict(features)[0]
-        
-        # Clamp prediction between 0-100
-        return max(0, min(100, prediction))
+# Aptitude topics, learning material and questions (see content/aptitude/*.json)
+content_store.on_reload = render_cache.clear
+
+# Computed insights per user, dropped whenever that user's results change.
+# Set INSIGHTS_CACHE_URL=redis://... to share the cache between workers.
+insights_cache = InsightsCache(backend_from_url(os.environ.get('INSIGHTS_CACHE_URL')),
+                               ttl=int(os.environ.get('INSIGHTS_CACHE_TTL', 300)))
+
+# Coding attempts are written behind the request in batches
+ingest_queue = IngestQueue(
+    on_flush=lambda batch: insights_cache.invalidate(*{attempt[0] for attempt in batch}))
+MAX_EVENTS_PER_BATCH = 500
+
+# AI code feedback runs on a background event loop; requests only submit and poll
+feedback_service = feedback.FeedbackService(
+    concurrency=int(os.environ.get('FEEDBACK_CONCURRENCY', 4)),
+    timeout=float(os.environ.get('FEEDBACK_TIMEOUT', 60)))
+
+# LeetCode question bank, indexed once and reloaded when the file changes.
+# Uses the catalogue synced by leetcode_sync.py, or the bundled file until then.
+question_bank = QuestionBank(leetcode_store.CATALOGUE_PATH, fallback_path='leetcode_questions.json')
+daily_question = leetcode_store.DailyQuestion()
+# Password hashing runs on its own bounded pool; failed logins are throttled first
+authenticator = auth.Authenticator(workers=int(os.environ.get('AUTH_WORKERS', 0)) or None,
+                                   max_pending=int(os.environ.get('AUTH_MAX_PENDING', 64)))
+
+# Logged-in users walk each pool in their own order, with failed problems coming back
+question_scheduler = QuestionScheduler(question_bank)
+
+# Background queues and caches are read when /metrics is scraped
+instrumentation.registry.gauge('app_ingest_queue', 'Coding-attempt ingest queue counters and depth',
+                               ingest_queue.stats, label='stat')
+instrumentation.registry.gauge('app_insights_cache', 'Insights cache lookups and invalidations',
+                               lambda: insights_cache.counters.counts(*CACHE_EVENTS), label='event')
+instrumentation.registry.gauge('app_feedback_jobs', 'Feedback job counters and pending jobs',
+                               feedback_service.stats, label='stat')
+instrumentation.registry.gauge('app_auth', 'Logins, failures, rehashes and throttling',
+                               authenticator.stats, label='stat')
+instrumentation.registry.gauge('app_sessions', 'Session loads, writes, skipped writes and deletes',
+                               app.session_interface.stats, label='stat')
+
+# Initialize SQLite database by applying any pending schema migrations
+def init_db():
+    with db.connection() as conn:
+        migrations.migrate(conn)
+    # Import any new aptitude content and render the shared pages up front
+    content_store.refresh(force=True)
+    render_cache.warm(cached_pages())
 
 
-class DifficultyRecommender:
-    def __init__(self):
-        self.model = LogisticRegression()
-        self.difficulties = ['Easy', 'Medium', 'Hard']
+def load_ml():
+    """Import the ML models on first use and start this worker's model refresh.
     
-    def recommend_difficulty(self, username, topic):
-        """Recommend difficulty based on user performance"""
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        
-        # Get coding attempt history
-        cursor.execute("""
-            SELECT difficulty, completed, time_spent, COUNT(*) as attempts
-            FROM coding_attempts 
-            WHERE username = ? AND topic = ?
-            GROUP BY difficulty
-        """, (username, topic))
-        
-        history = cursor.fetchall()
-        conn.close()
-        
-        if not history:
-            return "Easy"  # Start with Easy for new users
-        
-        # Calculate success rates
-        difficulty_stats = {}
-        for diff, completed, avg_time, attempts in history:
-            success_rate = completed / attempts if attempts > 0 else 0
-            difficulty_stats[diff] = {
-                'success_rate': success_rate,
-                'attempts': attempts,
-                'avg_time': avg_time or 1800  # Default 30 min
-            }
-        
-        # Simple rule-based recommendation
-        if 'Easy' in difficulty_stats:
-            easy_stats = difficulty_stats['Easy']
-            if easy_stats['success_rate'] >= 0.8 and easy_stats['avg_time'] < 1200:  # 20 min
-                if 'Medium' in difficulty_stats:
-                    medium_stats = difficulty_stats['Medium']
-                    if medium_stats['success_rate'] >= 0.6:
-                        return "Hard"
-                    else:
-                        return "Medium"
-                else:
-                    return "Medium"
-            else:
-                return "Easy"
-        
-        return "Easy"
+    NumPy and scikit-learn add about a second and tens of MB to every worker,
+    so only workers that serve insights (or set PRELOAD_ML=1) pay for them.
+    """
+    import ml_models
+    # Each worker polls for new artifacts; at most one of them retrains
+    ml_models.performance_model.start()
+    return ml_models
 
 
-class TopicRecommender:
-    def __init__(self):
-        self.topics = ["Percentages", "Time and Work", "Profit and Loss"]
-    
-    def suggest_next_topic(self, username):
-        """Suggest next topic to study"""
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        
-        topic_performance = {}
-        
-        for topic in self.topics:
-            cursor.execute("""
-                SELECT AVG(score*100.0/total_questions) as avg_score,
-                       COUNT(*) as attempts,
-                       MAX(timestamp) as last_attempt
-                FROM aptitude_progress 
-                WHERE username = ? AND topic = ?
-            """, (username, topic))
-            
-            result = cursor.fetchone()
-            
-            if result[0] is not None:
-                topic_performance[topic] = {
-                    'avg_score': result[0],
-                    'attempts': result[1],
-                    'last_attempt': result[2]
-                }
-        
-        conn.close()
-        
-        if not topic_performance:
-            return "Percentages"  # Start with basics
-        
-        # Decision tree logic
-        weak_topics = [topic for topic, stats in topic_performance.items() 
-                      if stats['avg_score'] < 70]
-        
-        if weak_topics:
-            # Recommend weakest topic
-            return min(weak_topics, 
-                      key=lambda t: topic_performance[t]['avg_score'])
-        
-        # If all topics are strong, recommend least practiced
-        return min(topic_performance.keys(), 
-                  key=lambda t: topic_performance[t]['attempts'])
+if os.environ.get('PRELOAD_ML') == '1':
+    load_ml()
 
 
-# Initialize the ML models
-performance_predictor = PerformancePredictor()
-difficulty_recommender = DifficultyRecommender()
-topic_recommender = TopicRecommender()
+@app.cli.command('train-model')
+def train_model_command():
+    """Train the performance model and write a new artifact"""
+    init_db()
+    performance_model = load_ml().performance_model
+    if performance_model.retrain():
+        print(f"Saved model {performance_model.metadata['version']}")
+    else:
+        print("Not enough data (or another process is training); no model saved")
 
-# Initialize SQLite database
-def init_db():
-    conn = sqlite3.connect('interview_data.db')
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-
-    # Create aptitude progress table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS aptitude_progress (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            topic TEXT NOT NULL,
-            score INTEGER,
-            total_questions INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Create notes table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            category TEXT DEFAULT 'General',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (username) REFERENCES users (username)
-        )
-    ''')
-    
-    # Create ML-specific tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS coding_attempts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            topic TEXT NOT NULL,
-            difficulty TEXT NOT NULL,
-            time_spent INTEGER DEFAULT 0,
-            completed BOOLEAN DEFAULT 0,
-            hints_used INTEGER DEFAULT 0,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_learning_patterns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            session_duration INTEGER,
-            questions_attempted INTEGER,
-            topics_covered TEXT,
-            performance_score REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Commit all changes and close connection ONCE at the end
-    conn.commit()
-    conn.close()
 
+@app.cli.command('sync-leetcode')
+def sync_leetcode_command():
+    """Fetch the LeetCode catalogue and daily question into LEETCODE_DIR"""
+    import asyncio
+    import leetcode_sync
+    print(json.dumps(asyncio.run(leetcode_sync.sync()), indent=2))
 
-# Fetch a random LeetCode question by topic and difficulty
-def get_random_leetcode_question(topic_slug, difficulty):
-    try:
-        with open('leetcode_questions.json', 'r') as f:
-            all_questions = json.load(f)
-
-        filtered = [
-            q for q in all_questions
-            if topic_slug in q.get("tags", [])
-               and q.get("difficulty", "").lower() == difficulty.lower()
-        ]
-
-        if not filtered:
-            return None
-
-        selected = random.choice(filtered)
-        return {
-            "title": selected["title"],
-            "slug": selected["titleSlug"],
-            "difficulty": selected["difficulty"],
-            "url": f"https://leetcode.com/problems/{selected['titleSlug']}/"
-        }
 
+# Fetch a LeetCode question by topic and difficulty: the user's next one, or a random one
+def get_random_leetcode_question(topic_slug, difficulty, username=None):
+    try:
+        if username is None:
+            return question_bank.random_question(topic_slug, difficulty)
+        conn = get_db()
+        questions = question_scheduler.draw(conn, username, topic_slug, difficulty)
+        conn.commit()
+        return questions[0] if questions else None
     except Exception as e:
         print(f"Error loading local question: {e}")
         return None
@@ -463,18 +158,19 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-        user = cursor.fetchone()
-        conn.close()
-
-        if user:
+        result = authenticator.authenticate(get_db(), username, password, request.remote_addr)
+        if result == auth.OK:
+            session.rotate()
             session['username'] = username
             return redirect('/dashboard')
-        else:
-            flash("Invalid username or password.")
-            return redirect('/login')
+        if result == auth.THROTTLED:
+            flash("Too many failed attempts. Please wait a few minutes and try again.")
+            return render_template('login.html'), 429, {'Retry-After': str(authenticator.throttle.window)}
+        if result == auth.BUSY:
+            flash("We're handling a lot of logins right now. Please try again in a moment.")
+            return render_template('login.html'), 503, {'Retry-After': '1'}
+        flash("Invalid username or password.")
+        return redirect('/login')
 
     return render_template('login.html')
 
@@ -491,19 +187,22 @@ def register():
             flash("Passwords do not match.")
             return redirect('/register')
 
-        conn = sqlite3.connect('interview_data.db')
+        password_hash = authenticator.hash_password(password)
+        if password_hash is None:
+            flash("We're handling a lot of sign-ups right now. Please try again in a moment.")
+            return render_template('register.html'), 503, {'Retry-After': '1'}
+
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", 
-                           (username, email, password))
+                           (username, email, password_hash))
             conn.commit()
             flash("Registration successful! Please log in.")
             return redirect('/login')
         except sqlite3.IntegrityError:
             flash("Username or email already exists.")
             return redirect('/register')
-        finally:
-            conn.close()
 
     return render_template('register.html')
 
@@ -511,16 +210,58 @@ def register():
 @app.route('/dashboard')
 def dashboard():
     if 'username' in session:
-        return render_template('dashboard.html', username=session['username'])
+        response = make_response(render_template('dashboard.html', username=session['username'],
+                                                 daily=daily_question.get()))
+        response.add_etag()
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     else:
         return redirect('/login')
 
 
+# Pages below are the same for every user: they are rendered once per process,
+# served with public caching headers, and personalised in the browser via /api/me
+def render_practice():
+    return render_template('practice.html', topics=leetcode_topics)
+
+
+def render_aptitude():
+    return render_template('aptitude.html', topics=content_store.topics())
+
+
+def render_formulas(topic_slug, topic):
+    content = topic and topic['formulas'] or "<p>Content coming soon for this topic.</p>"
+    topic_title = topic['title'] if topic else topic_slug.replace('-', ' ').title()
+    return render_template('learn.html', topic=topic_title, content=Markup(content))
+
+
+def render_material(topic):
+    return render_template('learn.html', topic=topic['title'], content=Markup(topic['material']))
+
+
+def cached_pages():
+    """(key, render) for every pre-rendered page"""
+    yield 'practice', render_practice
+    yield 'aptitude', render_aptitude
+    for summary in content_store.topics():
+        topic = content_store.topic(summary['slug'])
+        yield f"formulas:{topic['slug']}", lambda topic=topic: render_formulas(topic['slug'], topic)
+        if topic['material']:
+            yield f"material:{topic['slug']}", lambda topic=topic: render_material(topic)
+
+
+@app.route('/api/me')
+def whoami():
+    """The personalised fragment for cached pages"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify({'username': session['username']}), 200, {'Cache-Control': 'private, no-store'}
+
+
 @app.route('/practice')
 def practice():
-    if 'username' not in session:
-        return redirect('/login')
-    return render_template('practice.html', username=session['username'], topics=leetcode_topics)
+    return render_cache.response('practice', render_practice)
 
 
 @app.route('/get-dynamic-question')
@@ -531,48 +272,121 @@ def get_dynamic_question():
     if not topic or not difficulty:
         return jsonify({'error': 'Missing topic or difficulty'}), 400
 
-    question = get_random_leetcode_question(topic, difficulty)
+    question = get_random_leetcode_question(topic, difficulty, session.get('username'))
     if not question:
         return jsonify({'error': 'No question found'}), 404
 
     return jsonify(question)
 
 
-@app.route('/aptitude')
-def aptitude():
-    if 'username' not in session:
-        return redirect('/login')
+MAX_QUESTION_PAIRS = 100
+MAX_QUESTIONS_PER_PAIR = 10
+
 
-    topics = list(aptitude_questions.keys())
-    progress_dict = {topic: None for topic in topics}
+@app.route('/get-dynamic-questions', methods=['POST'])
+def get_dynamic_questions():
+    """The next k questions for each {topic, difficulty} pair in one response.
 
-    return render_template('aptitude.html',
-                           username=session['username'],
-                           topics=topics,
-                           progress_dict=progress_dict)
+    Nothing moves until a question is reported to /practice/shown, so a
+    page can prefetch questions it may never display. Logged-in users get
+    theirs from question_scheduler.upcoming. Anonymous sessions deal from
+    their own shuffle of every pool, and the cookie keeps how far they have
+    got, so no question repeats within a session whichever worker answers.
+    """
+    data = request.get_json(silent=True) or {}
+    pairs = data.get('pairs')
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({'error': 'Expected a non-empty "pairs" list'}), 400
+    if len(pairs) > MAX_QUESTION_PAIRS:
+        return jsonify({'error': f'At most {MAX_QUESTION_PAIRS} pairs per request'}), 413
+    try:
+        k = min(max(int(data.get('k', 5)), 1), MAX_QUESTIONS_PER_PAIR)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k must be a number'}), 400
+
+    username = session.get('username')
+    if username is None:
+        seed = session.setdefault('question_seed', random.getrandbits(32))
+        offsets = session.get('question_offsets', {})
+    questions = {}
+    for pair in pairs:
+        topic = pair.get('topic') if isinstance(pair, dict) else None
+        difficulty = pair.get('difficulty') if isinstance(pair, dict) else None
+        if not isinstance(topic, str) or not isinstance(difficulty, str):
+            return jsonify({'error': 'Each pair needs a topic and a difficulty'}), 400
+        key = f"{topic}:{difficulty}"
+        if key in questions:
+            continue
+        try:
+            if username is not None:
+                questions[key] = question_scheduler.upcoming(get_db(), username, topic, difficulty, k)
+            else:
+                questions[key], _ = question_bank.deal(
+                    topic, difficulty, seed, offsets.get(key.lower(), 0), k)
+        except Exception as e:
+            print(f"Error dealing questions for {key}: {e}")
+            questions[key] = []
+    if username is not None:
+        get_db().commit()
+    return jsonify({'questions': questions})
+
+
+@app.route('/practice/shown', methods=['POST'])
+def practice_question_shown():
+    """A question from /get-dynamic-questions was displayed: move past it"""
+    data = request.get_json(silent=True) or {}
+    topic, difficulty, slug = data.get('topic'), data.get('difficulty'), data.get('slug')
+    position = data.get('position')
+    if not all(isinstance(value, str) for value in (topic, difficulty, slug)):
+        return jsonify({'error': 'Expected a topic, difficulty and slug'}), 400
+    if position is not None and (isinstance(position, bool) or not isinstance(position, int)
+                                 or not 0 <= position < 2 ** 62):
+        return jsonify({'error': 'position must be a non-negative integer'}), 400
+    if not question_bank.questions_for(topic, difficulty):
+        return jsonify({'error': 'No such question pool'}), 404
+
+    username = session.get('username')
+    if username is not None:
+        conn = get_db()
+        question_scheduler.shown(conn, username, topic, difficulty, slug, position)
+        conn.commit()
+    elif position is not None:
+        key = f"{topic}:{difficulty}".lower()
+        offsets = session.setdefault('question_offsets', {})
+        offsets[key] = max(offsets.get(key, 0), position + 1)
+        session.modified = True
+    return '', 204
+
+
+@app.route('/daily-question')
+def get_daily_question():
+    """Today's LeetCode challenge from the last sync (never calls LeetCode)"""
+    question = daily_question.get()
+    if not question:
+        return jsonify({'error': 'Daily question not synced yet'}), 404
+    return jsonify(dict(question, stale=question.get('date') != datetime.now(timezone.utc).date().isoformat()))
 
 
-@app.route('/aptitude/learn/<topic_slug>')
-def learn_topic(topic_slug):
-    if 'username' not in session:
-        return redirect('/login')
+@app.route('/aptitude')
+def aptitude():
+    return render_cache.response('aptitude', render_aptitude)
 
-    content = aptitude_formulas.get(topic_slug, "<p>Content coming soon for this topic.</p>")
-    topic_title = topic_slug.replace('-', ' ').title()
 
-    return render_template('learn.html', username=session['username'], topic=topic_title, content=Markup(content))
+@app.route('/aptitude/learn/<topic_slug>')
+def learn_topic(topic_slug):
+    topic = content_store.topic(topic_slug)
+    if topic is None:
+        # Only known topics are cached, so arbitrary slugs cannot grow the cache
+        return render_formulas(topic_slug, None)
+    return render_cache.response(f'formulas:{topic_slug}', lambda: render_formulas(topic_slug, topic))
 
 
 @app.route('/learn/<topic>')
 def learn(topic):
-    if 'username' not in session:
-        return redirect('/login')
-
-    topic_title = topic.replace("-", " ").title()
-    content = learning_materials.get(topic_title)
+    content = content_store.topic(topic)
 
-    if content:
-        return render_template('learn.html', topic_name=topic_title, content=content)
+    if content and content['material']:
+        return render_cache.response(f'material:{topic}', lambda: render_material(content))
     else:
         flash("Learning material not available for this topic.")
         return redirect('/aptitude')
@@ -584,31 +398,91 @@ def notes():
     if 'username' not in session:
         return redirect('/login')
     
-    conn = sqlite3.connect('interview_data.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, title, content, category, created_at, updated_at 
-        FROM notes 
-        WHERE username = ? 
-        ORDER BY updated_at DESC
-    """, (session['username'],))
+    # Only one page of titles and previews; full content is fetched on demand
+    conn = get_db()
+    category = request.args.get('category') or None
+    notes_list, next_cursor = notes_store.list_page(conn, session['username'], category,
+                                                    request.args.get('cursor'))
+    facets = notes_store.category_facets(conn, session['username'])
     
-    user_notes = cursor.fetchall()
-    conn.close()
+    return render_template('notes.html', username=session['username'], notes=notes_list,
+                           next_cursor=next_cursor, category=category, facets=facets,
+                           total_notes=sum(facets.values()))
+
+
+@app.route('/notes/search')
+def search_notes():
+    """Ranked full-text search over the user's notes, one page at a time"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
     
-    # Convert to list of dictionaries for easier template handling
-    notes_list = []
-    for note in user_notes:
-        notes_list.append({
-            'id': note[0],
-            'title': note[1],
-            'content': note[2],
-            'category': note[3],
-            'created_at': note[4],
-            'updated_at': note[5]
-        })
+    conn = get_db()
+    text = request.args.get('q', '')
+    category = request.args.get('category') or None
+    limit = min(max(request.args.get('limit', notes_store.PAGE_SIZE, type=int), 1), 100)
+    results, next_cursor = notes_store.search(conn, session['username'], text, category,
+                                              request.args.get('cursor'), limit)
+    
+    return jsonify({
+        'results': results,
+        'next_cursor': next_cursor,
+        # Facets only change with the query, so skip them when paging
+        'facets': None if request.args.get('cursor') else
+                  notes_store.category_facets(conn, session['username'], text)
+    })
+
+
+@app.route('/api/notes')
+def notes_api():
+    """One keyset page of notes as JSON; pass next_cursor back as ?cursor= for the next"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
     
-    return render_template('notes.html', username=session['username'], notes=notes_list)
+    category = request.args.get('category') or None
+    limit = min(max(request.args.get('limit', notes_store.PAGE_SIZE, type=int), 1), 100)
+    notes_list, next_cursor = notes_store.list_page(get_db(), session['username'], category,
+                                                    request.args.get('cursor'), limit)
+    return jsonify({'notes': notes_list, 'next_cursor': next_cursor})
+
+
+@app.route('/notes/export')
+def export_notes():
+    """Download every note as NDJSON or a zip of Markdown files, streamed row by row"""
+    if 'username' not in session:
+        return redirect('/login')
+    
+    username = session['username']
+    category = request.args.get('category') or None
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'markdown'):
+        return jsonify({'error': 'format must be ndjson or markdown'}), 400
+    
+    def generate():
+        # stream_with_context keeps the request's connection checked out until the last chunk
+        notes_iter = notes_store.iter_notes(get_db(), username, category)
+        if export_format == 'markdown':
+            yield from notes_store.export_markdown_zip(notes_iter)
+        else:
+            yield from notes_store.export_ndjson(notes_iter)
+    
+    if export_format == 'markdown':
+        mimetype, filename = 'application/zip', 'notes.zip'
+    else:
+        mimetype, filename = 'application/x-ndjson', 'notes.ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/api/notes/<int:note_id>')
+def note_detail(note_id):
+    """Full content of one note (for Read More and quick edit)"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    note = notes_store.get_note(get_db(), session['username'], note_id)
+    if not note:
+        return jsonify({'error': 'Note not found'}), 404
+    return jsonify(note)
 
 
 @app.route('/notes/create', methods=['GET', 'POST'])
@@ -625,14 +499,13 @@ def create_note():
             flash("Title and content are required.")
             return redirect('/notes/create')
         
-        conn = sqlite3.connect('interview_data.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO notes (username, title, content, category) 
             VALUES (?, ?, ?, ?)
         """, (session['username'], title, content, category))
         conn.commit()
-        conn.close()
         
         flash("Note created successfully!")
         return redirect('/notes')
@@ -645,7 +518,7 @@ def edit_note(note_id):
     if 'username' not in session:
         return redirect('/login')
     
-    conn = sqlite3.connect('interview_data.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     if request.method == 'POST':
@@ -663,7 +536,6 @@ def edit_note(note_id):
             WHERE id = ? AND username = ?
         """, (title, content, category, note_id, session['username']))
         conn.commit()
-        conn.close()
         
         flash("Note updated successfully!")
         return redirect('/notes')
@@ -676,7 +548,6 @@ def edit_note(note_id):
     """, (note_id, session['username']))
     
     note = cursor.fetchone()
-    conn.close()
     
     if not note:
         flash("Note not found.")
@@ -697,66 +568,81 @@ def delete_note(note_id):
     if 'username' not in session:
         return redirect('/login')
     
-    conn = sqlite3.connect('interview_data.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM notes WHERE id = ? AND username = ?", (note_id, session['username']))
     conn.commit()
-    conn.close()
     
     flash("Note deleted successfully!")
     return redirect('/notes')
 
 
+def quiz_finished_message(score, total):
+    percent = int((score / total) * 100)
+    return f"<h2>Quiz Finished! You scored {score}/{total} ({percent}%)</h2><br><a href='/ml-insights'>View AI Insights</a><br><a href='/aptitude'>Back to Aptitude</a>"
+
+
+def live_quiz(conn, username, topic):
+    """The user's quiz on an aptitude topic and its current question, or (None, None)"""
+    for _ in range(2):
+        quiz = quiz_engine.current_quiz(conn, username, topic['title'],
+                                        lambda n: content_store.sample(topic['slug'], n))
+        if quiz is None:
+            return None, None
+        question = content_store.question(conn, quiz['question_ids'][quiz['index']])
+        if question is not None:
+            return quiz, question
+        # The question was edited out of the bank; start again with a fresh draw
+        quiz_engine.abandon(conn, username, topic['title'])
+    return None, None
+
+
+def quiz_step(topic_title, quiz, question):
+    """JSON payload for one quiz step; never includes the answer key"""
+    index, total = quiz['index'], len(quiz['question_ids'])
+    return {
+        'topic': topic_title,
+        'index': index,
+        'total': total,
+        'progress': int((index / total) * 100),
+        'question': {'question': question['question'], 'options': question['options']}
+    }
+
+
 @app.route('/solve/<topic>', methods=['GET', 'POST'])
 def solve(topic):
     if 'username' not in session:
         return redirect('/login')
 
-    topic_title = topic.replace("-", " ").title()
-    questions = aptitude_questions.get(topic_title, [])
-    total = len(questions)
-
-    if 'quiz_data' not in session or session['quiz_data'].get('topic') != topic_title:
-        session['quiz_data'] = {
-            'topic': topic_title,
-            'answers': [],
-            'index': 0,
-            'start_time': datetime.now().isoformat()  # Track start time
-        }
-
-    quiz = session['quiz_data']
-    index = quiz['index']
-
-    if index >= total:
-        score = sum([1 for i, q in enumerate(questions)
-                     if quiz['answers'][i] == q['answer']])
-        percent = int((score / total) * 100)
-        
-        # Store results in database for ML
-        conn = sqlite3.connect('interview_data.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO aptitude_progress (username, topic, score, total_questions)
-            VALUES (?, ?, ?, ?)
-        """, (session['username'], topic_title, score, total))
-        conn.commit()
-        conn.close()
-        
-        session.pop('quiz_data', None)
-        return f"<h2>Quiz Finished! You scored {score}/{total} ({percent}%)</h2><br><a href='/ml-insights'>View AI Insights</a><br><a href='/aptitude'>Back to Aptitude</a>"
+    content = content_store.topic(topic)
+    if not content or not content['questions']:
+        flash("No questions available for this topic yet.")
+        return redirect('/aptitude')
+
+    # Quiz state lives in quiz_sessions, not in the cookie
+    conn = get_db()
+    username = session['username']
+    topic_title = content['title']
 
     if request.method == 'POST':
         selected = request.form.get('answer')
-        if selected:
-            quiz['answers'].append(selected)
-            quiz['index'] += 1
-            session['quiz_data'] = quiz
+        index = request.form.get('index', type=int)
+        if selected and index is not None:
+            result = quiz_engine.submit_answer(conn, username, topic_title, index, selected)
+            if result and result['finished']:
+                insights_cache.invalidate(username)
+                return quiz_finished_message(result['score'], result['total'])
         return redirect(f"/solve/{topic}")
 
-    current_question = questions[index]
+    quiz, current_question = live_quiz(conn, username, content)
+    if quiz is None:
+        flash("No questions available for this topic yet.")
+        return redirect('/aptitude')
+    index, total = quiz['index'], len(quiz['question_ids'])
     progress = int((index / total) * 100)
 
     return render_template("solve.html",
+                           topic=topic,
                            topic_name=topic_title,
                            question=current_question,
                            current_index=index,
@@ -764,46 +650,143 @@ def solve(topic):
                            progress=progress)
 
 
-@app.route('/ml-insights')
-def ml_insights():
+@app.route('/api/quiz/<topic>')
+def quiz_current(topic):
+    """Current question of the user's quiz on a topic"""
     if 'username' not in session:
-        return redirect('/login')
-    
+        return jsonify({'error': 'Not logged in'}), 401
+
+    content = content_store.topic(topic)
+    quiz, question = live_quiz(get_db(), session['username'], content) if content else (None, None)
+    if quiz is None:
+        return jsonify({'error': 'No questions for this topic'}), 404
+
+    return jsonify(quiz_step(content['title'], quiz, question))
+
+
+@app.route('/api/quiz/<topic>/answer', methods=['POST'])
+def quiz_answer(topic):
+    """Score one answer and return the next question (or the final score)"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    content = content_store.topic(topic)
+    if not content or not content['questions']:
+        return jsonify({'error': 'No questions for this topic'}), 404
+
+    data = request.get_json(silent=True) or {}
+    index = data.get('index')
+    selected = data.get('answer')
+    if not isinstance(index, int) or not selected:
+        return jsonify({'error': 'Missing index or answer'}), 400
+
+    conn = get_db()
     username = session['username']
+    topic_title = content['title']
+    result = quiz_engine.submit_answer(conn, username, topic_title, index, selected)
+    if result is None:
+        # Stale step (another tab moved on): send the real current question
+        quiz, question = live_quiz(conn, username, content)
+        if quiz is None:
+            return jsonify({'error': 'No questions for this topic'}), 404
+        return jsonify(dict(quiz_step(topic_title, quiz, question), stale=True)), 409
+
+    if result['finished']:
+        insights_cache.invalidate(username)
+        total = result['total']
+        return jsonify({'finished': True, 'correct': result['correct'],
+                        'score': result['score'], 'total': total,
+                        'percent': int((result['score'] / total) * 100)})
+
+    quiz, question = live_quiz(conn, username, content)
+    return jsonify(dict(quiz_step(topic_title, quiz, question), correct=result['correct']))
+
+
+def compute_insights(username):
+    """Everything /ml-insights shows; cached per user in insights_cache"""
+    ml = load_ml()
     
     # Get AI recommendations
-    next_topic = topic_recommender.suggest_next_topic(username)
+    next_topic = ml.topic_recommender.suggest_next_topic(username)
     
     # Get performance prediction for the recommended topic
-    predicted_score = performance_predictor.predict_performance(username, next_topic)
+    predicted_score = ml.performance_model.current.predict_performance(username, next_topic)
     
     # Get difficulty recommendation for coding
-    recommended_difficulty = difficulty_recommender.recommend_difficulty(username, "array")
+    recommended_difficulty = ml.difficulty_recommender.recommend_difficulty(username, "array")
     
     # Get user stats for dashboard
-    conn = sqlite3.connect('interview_data.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT COUNT(*) as total_attempts,
-               AVG(score*100.0/total_questions) as avg_performance
-        FROM aptitude_progress 
-        WHERE username = ?
-    """, (username,))
-    
-    stats = cursor.fetchone()
-    conn.close()
+    stats = user_stats.user_totals(get_db(), username)
+    
+    return {
+        'next_topic': next_topic,
+        'predicted_score': round(float(predicted_score), 1) if predicted_score else "Not available",
+        'recommended_difficulty': recommended_difficulty,
+        'total_attempts': stats[0] if stats[0] else 0,
+        'avg_performance': round(stats[1], 1) if stats[1] else 0
+    }
+
+
+def not_modified(etag, last_modified):
+    """Whether the client's conditional headers match (If-None-Match wins over If-Modified-Since)"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified <= since.timestamp()
+
+
+@app.route('/ml-insights')
+def ml_insights():
+    if 'username' not in session:
+        return redirect('/login')
     
-    total_attempts = stats[0] if stats[0] else 0
-    avg_performance = round(stats[1], 1) if stats[1] else 0
+    username = session['username']
+    entry = insights_cache.get_or_compute(username, lambda: compute_insights(username))
     
-    return render_template('ml_insights.html',
-                         username=username,
-                         next_topic=next_topic,
-                         predicted_score=round(predicted_score, 1) if predicted_score else "Not available",
-                         recommended_difficulty=recommended_difficulty,
-                         total_attempts=total_attempts,
-                         avg_performance=avg_performance)
+    # Repeat views of unchanged insights skip rendering altogether
+    if not_modified(entry['etag'], entry['computed_at']):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render_template('ml_insights.html', username=username,
+                                                 **entry['data']))
+    response.set_etag(entry['etag'])
+    response.last_modified = datetime.fromtimestamp(entry['computed_at'], timezone.utc)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/ml-insights/cache-stats')
+def insights_cache_stats():
+    """Hit/miss counters for the insights cache in this worker"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify(insights_cache.stats())
+
+
+@app.route('/ml-insights/model-status')
+def model_status():
+    """Report which performance model is live and whether it is stale"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify(load_ml().performance_model.status())
+
+
+def coding_attempt_from(data, username):
+    """Validate one tracking event into the tuple the ingest queue expects"""
+    def as_int(value):
+        try:
+            return max(0, int(value or 0))
+        except (TypeError, ValueError):
+            return 0
+
+    return (username,
+            str(data.get('topic', 'unknown')),
+            str(data.get('difficulty', 'Easy')),
+            as_int(data.get('time_spent', 0)),
+            bool(data.get('completed', False)),
+            as_int(data.get('hints_used', 0)),
+            str(data['slug'])[:200] if data.get('slug') else None)
 
 
 @app.route('/track-coding-attempt', methods=['POST'])
@@ -812,25 +795,137 @@ def track_coding_attempt():
     if 'username' not in session:
         return jsonify({'error': 'Not logged in'}), 401
     
-    data = request.get_json()
-    username = session['username']
-    topic = data.get('topic', 'unknown')
-    difficulty = data.get('difficulty', 'Easy')
-    time_spent = data.get('time_spent', 0)
-    completed = data.get('completed', False)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
     
-    conn = sqlite3.connect('interview_data.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO coding_attempts (username, topic, difficulty, time_spent, completed)
-        VALUES (?, ?, ?, ?, ?)
-    """, (username, topic, difficulty, time_spent, completed))
-    conn.commit()
-    conn.close()
+    # Written by the background writer in the next batch
+    if not ingest_queue.submit(coding_attempt_from(data, session['username'])):
+        return jsonify({'error': 'Too busy, retry later'}), 503, {'Retry-After': '1'}
     
     return jsonify({'success': True})
 
 
+@app.route('/track-coding-attempts', methods=['POST'])
+def track_coding_attempts():
+    """Bulk endpoint for batched tracking events (sent with navigator.sendBeacon)"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    # sendBeacon may not label the body as JSON, so parse it regardless
+    data = request.get_json(force=True, silent=True)
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list):
+        return jsonify({'error': 'Expected a list of events'}), 400
+    
+    events = [event for event in events[:MAX_EVENTS_PER_BATCH] if isinstance(event, dict)]
+    accepted = sum(ingest_queue.submit(coding_attempt_from(event, session['username']))
+                   for event in events)
+    status = 202 if accepted == len(events) else 503
+    return jsonify({'accepted': accepted, 'dropped': len(events) - accepted}), status
+
+
+@app.route('/feedback', methods=['POST'])
+def submit_feedback():
+    """Queue AI feedback on a solution; poll /feedback/<job_id> for the result"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    code = data.get('code')
+    problem_slug = data.get('problem_slug')
+    language = str(data.get('language') or 'python')
+    if not isinstance(code, str) or not code.strip() or not isinstance(problem_slug, str):
+        return jsonify({'error': 'Missing code or problem_slug'}), 400
+    if len(code) > feedback.MAX_CODE_CHARS:
+        return jsonify({'error': f'Code is limited to {feedback.MAX_CODE_CHARS} characters'}), 413
+    
+    try:
+        job = feedback_service.submit(get_db(), problem_slug, language, code)
+    except RuntimeError as e:
+        print(f"Error starting feedback job: {e}")
+        return jsonify({'error': 'Feedback is unavailable, retry later'}), 503, {'Retry-After': '30'}
+    if job is None:
+        return jsonify({'error': 'Too busy, retry later'}), 503, {'Retry-After': '5'}
+    return jsonify(job), 200 if job['status'] == 'done' else 202
+
+
+@app.route('/feedback/<job_id>')
+def feedback_status(job_id):
+    """Poll a feedback job; Retry-After says when to ask again"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    job = feedback_service.status(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] in ('queued', 'running'):
+        return jsonify(job), 200, {'Retry-After': '1'}
+    return jsonify(job)
+
+
+@app.route('/feedback/<job_id>/events')
+def feedback_events(job_id):
+    """Server-sent events: one 'status' event once the job finishes, instead of polling.
+    
+    Here every open stream holds a worker thread; asgi.py serves this path on
+    its event loop instead, where a waiting stream costs no thread.
+    """
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    # Take the first waiter before the headers go out: once they have, a job loop
+    # that cannot start would only leave the client reconnecting to a broken stream
+    try:
+        first = feedback_service.finished(job_id)
+    except RuntimeError as e:
+        print(f"Error starting feedback job loop: {e}")
+        return jsonify({'error': 'Feedback is unavailable, retry later'}), 503, {'Retry-After': '30'}
+    
+    def generate(waiter):
+        # Not stream_with_context: a stream open for minutes must not keep a pooled connection
+        yield f"retry: {feedback.RETRY_MS}\n\n"
+        deadline = time.monotonic() + feedback.EVENTS_TIMEOUT
+        while True:
+            try:
+                with db.connection() as conn:
+                    job = feedback_service.status(conn, job_id)
+                if feedback.is_finished(job) or time.monotonic() >= deadline:
+                    yield feedback.status_event(job)
+                    return
+                # Nothing to re-read until the waiter resolves
+                while not waiter.done() and time.monotonic() < deadline:
+                    try:
+                        waiter.result(feedback.HEARTBEAT_SECONDS)
+                    except concurrent.futures.TimeoutError:
+                        yield ": keep-alive\n\n"
+            finally:
+                # Gives up the waiter on the deadline, or when the client goes away
+                # (GeneratorExit), so the service can drop it
+                waiter.cancel()
+            waiter = feedback_service.finished(job_id)
+    
+    response = Response(generate(first), mimetype='text/event-stream', headers=feedback.EVENT_HEADERS)
+    # A client gone before the stream started never runs the generator's cleanup
+    response.call_on_close(first.cancel)
+    return response
+
+
+@app.route('/feedback/stats')
+def feedback_stats():
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify(feedback_service.stats())
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require it as a bearer token"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/logout')
 def logout():
     session.pop('username', None)
@@ -839,4 +934,5 @@ def logout():
 
 if __name__ == '__main__':
     init_db()
+    question_bank.load()
     app.run(debug=True)
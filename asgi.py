@@ -0,0 +1,344 @@
+"""ASGI entry point: the Flask app on a bounded thread pool, plus native async routes
+
+    uvicorn asgi:app --workers 4 --no-access-log
+    SERVER_MODE=async gunicorn                   # uvicorn workers, see gunicorn.conf.py
+
+The views are the same synchronous Flask code. Each request runs on one of
+WSGI_THREADS threads and its body is handed to the event loop a chunk at a
+time, a few chunks ahead of the client, so streamed exports stay flat in
+memory and a client that disconnects stops the stream.
+
+Routes that mostly wait run as coroutines on the event loop instead.
+/feedback/<job_id>/events waits for the feedback job without a thread, so
+one process can hold thousands of open streams while the pool stays free
+for ordinary requests; under sync workers (app.py's version of the route)
+every open stream ties up a worker thread until it ends.
+
+There is no async database driver: the few queries the async routes make
+go through asyncio.to_thread, and everything else is the unchanged app.
+"""
+import asyncio
+import io
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+import app as web
+import db
+import feedback
+from instrumentation import REQUESTS, REQUEST_LATENCY, Counter
+
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))  # db.pool holds 8 connections
+MAX_BODY_BYTES = 16 * 1024 * 1024
+BUFFERED_CHUNKS = 8
+
+FEEDBACK_EVENTS_PATH = re.compile(r'/feedback/([^/]+)/events')
+FEEDBACK_EVENTS_ROUTE = '/feedback/<job_id>/events'
+BRIDGE_EVENTS = ('requests', 'disconnects', 'errors')
+
+
+def wsgi_environ(scope, body):
+    """The PEP 3333 environ for an ASGI http scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                # Cookies are listed with '; ' (RFC 6265), other repeated headers with ','
+                value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+            environ[key] = value
+    return environ
+
+
+async def read_body(receive):
+    """The request body, or None if the client went away; stops reading past MAX_BODY_BYTES"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body') or len(body) > MAX_BODY_BYTES:
+            return bytes(body)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_response(send, status, content_type, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()),
+                            *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WSGIBridge:
+    """Serve a WSGI app over ASGI, each request on a bounded pool of threads"""
+
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self._executor = None
+        # Errors are counted on the pool threads, the rest on the event loop
+        self.counters = Counter('app_asgi_bridge', 'ASGI bridge requests, disconnects and errors', ('event',))
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+        if len(body) > MAX_BODY_BYTES:
+            await send_response(send, 413, b'text/plain', b'Request body too large')
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='wsgi')
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(BUFFERED_CHUNKS)
+        disconnected = threading.Event()  # the client went away: stop producing
+        gone = threading.Event()  # nobody reads the queue any more: stop putting
+
+        def put(message):
+            if not gone.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        self.counters.inc(event='requests')
+        self.active += 1
+        watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+        watcher.add_done_callback(lambda task: task.cancelled() or disconnected.set())
+        loop.run_in_executor(self._executor, self._run, wsgi_environ(scope, body), put, disconnected)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                if not disconnected.is_set():
+                    await send(message)
+        finally:
+            self.active -= 1
+            if disconnected.is_set():
+                self.counters.inc(event='disconnects')
+            watcher.cancel()
+            gone.set()
+            # Let a put that was already waiting for room complete
+            while not queue.empty():
+                queue.get_nowait()
+
+    def _run(self, environ, put, disconnected):
+        """Run the app on a pool thread, passing ASGI messages back through put; None ends them"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response.update(status=int(status.split(' ', 1)[0]), headers=headers)
+            return write
+
+        def send_start():
+            if not response.get('sent'):
+                response['sent'] = True
+                put({'type': 'http.response.start', 'status': response['status'],
+                     'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                 for name, value in response['headers']]})
+
+        def write(data):
+            send_start()
+            put({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if disconnected.is_set():
+                        break
+                    if chunk:
+                        write(chunk)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            send_start()
+            put({'type': 'http.response.body', 'body': b''})
+        except Exception as e:
+            self.counters.inc(event='errors')
+            print(f"Error serving {environ['REQUEST_METHOD']} {environ['PATH_INFO']}: {e!r}")
+            if not response.get('sent'):
+                response.update(status=500, headers=[('Content-Type', 'text/plain')], sent=False)
+                send_start()
+                put({'type': 'http.response.body', 'body': b'Internal Server Error'})
+            # Otherwise the response is cut short and the server closes the connection
+        finally:
+            put(None)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return dict(self.counters.counts(*BRIDGE_EVENTS), active=self.active, threads=self.threads)
+
+
+class FeedbackEvents:
+    """/feedback/<job_id>/events on the event loop: a waiting stream holds no thread"""
+
+    def __init__(self, service):
+        self.service = service
+        self.counters = {'streams': 0, 'open': 0, 'unauthorized': 0}
+
+    @staticmethod
+    def _username(scope):
+        cookies = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        morsel = cookies.get(web.app.session_interface.get_cookie_name(web.app))
+        record = web.app.session_interface.backend.load(morsel.value) if morsel else None
+        return record[0].get('username') if record else None
+
+    def _status(self, job_id):
+        with db.connection() as conn:
+            return self.service.status(conn, job_id)
+
+    async def __call__(self, scope, receive, send, job_id):
+        started = time.perf_counter()
+        status = 200
+        try:
+            if await asyncio.to_thread(self._username, scope) is None:
+                status = 401
+                self.counters['unauthorized'] += 1
+                await send_response(send, 401, b'application/json', b'{"error": "Not logged in"}')
+                return
+            # Before the headers: a job loop that cannot start gets a 503, not a broken stream
+            try:
+                waiter = asyncio.wrap_future(await asyncio.to_thread(self.service.finished, job_id))
+            except RuntimeError as e:
+                status = 503
+                print(f"Error starting feedback job loop: {e}")
+                await send_response(send, 503, b'application/json',
+                                    b'{"error": "Feedback is unavailable, retry later"}',
+                                    [(b'retry-after', b'30')])
+                return
+            self.counters['streams'] += 1
+            self.counters['open'] += 1
+            try:
+                await self._stream(receive, send, job_id, waiter)
+            finally:
+                self.counters['open'] -= 1
+        finally:
+            REQUESTS.inc(route=FEEDBACK_EVENTS_ROUTE, method='GET', status=str(status))
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route=FEEDBACK_EVENTS_ROUTE, method='GET')
+
+    async def _stream(self, receive, send, job_id, waiter):
+        # Same events as app.feedback_events
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            *((name.lower().encode(), value.encode()) for name, value in feedback.EVENT_HEADERS.items())]})
+
+        async def emit(text):
+            await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        loop = asyncio.get_running_loop()
+        try:
+            await emit(f"retry: {feedback.RETRY_MS}\n\n")
+            deadline = loop.time() + feedback.EVENTS_TIMEOUT
+            while not disconnected.done():
+                job = await asyncio.to_thread(self._status, job_id)
+                if feedback.is_finished(job) or loop.time() >= deadline:
+                    waiter.cancel()
+                    await emit(feedback.status_event(job))
+                    break
+                # Nothing to re-read until the waiter resolves
+                while not waiter.done() and not disconnected.done() and loop.time() < deadline:
+                    await asyncio.wait([waiter, disconnected], timeout=feedback.HEARTBEAT_SECONDS,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    if not waiter.done() and not disconnected.done():
+                        await emit(": keep-alive\n\n")
+                waiter.cancel()  # gives up the waiter if the job is still going
+                waiter = asyncio.wrap_future(self.service.finished(job_id))
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            waiter.cancel()
+            disconnected.cancel()
+
+
+class Application:
+    """The ASGI app: lifespan, native async routes, then everything else through the bridge"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.bridge = WSGIBridge(flask_app)
+        self.feedback_events = FeedbackEvents(web.feedback_service)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return  # no websockets
+        match = FEEDBACK_EVENTS_PATH.fullmatch(scope['path'])
+        if match and scope['method'] == 'GET':
+            await self.feedback_events(scope, receive, send, match.group(1))
+        else:
+            await self.bridge(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await asyncio.to_thread(self._startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': repr(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.to_thread(self.bridge.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _startup():
+        # What `python app.py` does before serving; each worker runs it
+        web.init_db()
+        web.question_bank.load()
+
+
+app = Application(web.app)
+
+web.instrumentation.registry.gauge('app_asgi_bridge', 'ASGI bridge requests, active requests and threads',
+                                   app.bridge.stats, label='stat')
+web.instrumentation.registry.gauge('app_feedback_event_streams', 'Feedback event streams opened and open now',
+                                   lambda: app.feedback_events.counters, label='stat')
@@ -0,0 +1,212 @@
+"""Password hashing, login verification and login throttling
+
+Passwords are stored as scrypt hashes:
+
+    scrypt$<n>$<r>$<p>$<salt, base64>$<key, base64>
+
+scrypt is deliberately slow, so hashing runs on a small thread pool
+(hashlib.scrypt releases the GIL) with a bounded queue. A burst of logins
+then queues for a few hashing threads instead of tying up every request
+thread, and is turned away with "busy" once the queue is full.
+
+Rows written before hashing existed hold the plaintext password. They
+still log in and are rehashed on the spot, as are hashes made with an
+older cost (AUTH_SCRYPT_N).
+
+LoginThrottle counts failures per IP and per username, in memory, and
+rejects a key that has too many before any hash is computed. It is per
+process, so with several workers the effective limits are that many
+times higher.
+"""
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import Counter
+from util import PerProcess
+
+SCRYPT_N = int(os.environ.get('AUTH_SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PREFIX = 'scrypt$'
+
+OK = 'ok'
+INVALID = 'invalid'
+THROTTLED = 'throttled'
+BUSY = 'busy'
+
+AUTH_EVENTS = ('logins', 'failures', 'rehashed', 'busy')
+THROTTLE_EVENTS = ('rejected', 'evictions')
+
+
+class PasswordHasher:
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, salt_bytes=16, key_bytes=32):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_bytes = salt_bytes
+        self.key_bytes = key_bytes
+
+    @staticmethod
+    def _derive(password, salt, n, r, p, key_bytes):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=key_bytes,
+                              maxmem=256 * n * r + 1024 * 1024)
+
+    def hash(self, password):
+        salt = os.urandom(self.salt_bytes)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.key_bytes)
+        return (f"{PREFIX}{self.n}${self.r}${self.p}$"
+                f"{base64.b64encode(salt).decode()}${base64.b64encode(key).decode()}")
+
+    def verify(self, stored, password):
+        """Whether password matches a stored hash, or a legacy plaintext value"""
+        if not stored.startswith(PREFIX):
+            return hmac.compare_digest(stored.encode(), password.encode())
+        try:
+            _, n, r, p, salt, key = stored.split('$')
+            key = base64.b64decode(key)
+            derived = self._derive(password, base64.b64decode(salt), int(n), int(r), int(p), len(key))
+        except ValueError:
+            return False
+        return hmac.compare_digest(derived, key)
+
+    def needs_rehash(self, stored):
+        """True for plaintext rows and hashes made with other parameters"""
+        return not stored.startswith(f"{PREFIX}{self.n}${self.r}${self.p}$")
+
+
+class LoginThrottle:
+    """Failed-login counters per key over a fixed window, LRU-evicted past max_entries"""
+
+    def __init__(self, max_user_failures=5, max_ip_failures=30, window=900, max_entries=100000):
+        self.max_user_failures = max_user_failures
+        self.max_ip_failures = max_ip_failures
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> [failures, window start]
+        self._lock = threading.Lock()
+        self.counters = Counter('app_login_throttle', 'Logins refused and keys evicted', ('event',))
+
+    def _limits(self, ip, username):
+        return ((f"ip:{ip}", self.max_ip_failures), (f"user:{username.lower()}", self.max_user_failures))
+
+    def retry_after(self, ip, username):
+        """Seconds until this IP and username may try again; 0 when allowed"""
+        now = time.monotonic()
+        wait = 0
+        with self._lock:
+            for key, limit in self._limits(ip, username):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] >= limit and now - entry[1] < self.window:
+                    wait = max(wait, int(self.window - (now - entry[1])) + 1)
+            if wait:
+                self.counters.inc(event='rejected')
+        return wait
+
+    def failed(self, ip, username):
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._limits(ip, username):
+                entry = self._entries.get(key)
+                if entry is None or now - entry[1] >= self.window:
+                    self._entries[key] = [1, now]
+                else:
+                    entry[0] += 1
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters.inc(event='evictions')
+
+    def succeeded(self, ip, username):
+        # Only the account's counter resets; a shared IP keeps its failures
+        with self._lock:
+            self._entries.pop(f"user:{username.lower()}", None)
+
+    def stats(self):
+        return dict(self.counters.counts(*THROTTLE_EVENTS), tracked=len(self._entries), max_entries=self.max_entries)
+
+
+class Authenticator:
+    def __init__(self, hasher=None, throttle=None, workers=None, max_pending=64, timeout=10.0):
+        self.hasher = hasher or PasswordHasher()
+        self.throttle = throttle or LoginThrottle()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._ensure_started = PerProcess(self._start)
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Checked against for unknown usernames; hashed here so no request pays for it
+        self._dummy = self.hasher.hash(os.urandom(8).hex())
+        self.counters = Counter('app_auth', 'Logins, failures, rehashes and busy answers', ('event',))
+
+    def _start(self):
+        # Pool threads do not survive a fork
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='auth-hash')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _run(self, fn, *args):
+        """Run fn on the hashing pool; None when the queue is full or fn takes over timeout"""
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            self.counters.inc(event='busy')
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        # The slot is held until the hash is done, even if the caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.counters.inc(event='busy')
+            return None
+
+    def hash_password(self, password):
+        """A new hash for password, or None if the hashing pool is saturated"""
+        return self._run(self.hasher.hash, password)
+
+    def authenticate(self, conn, username, password, ip):
+        """OK, INVALID, THROTTLED or BUSY; upgrades plaintext and outdated hashes on success"""
+        if self.throttle.retry_after(ip, username):
+            return THROTTLED
+
+        row = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            # Spend the same time as a real check, and answer BUSY the same way when
+            # the pool is saturated, so neither reveals which usernames exist
+            if self._run(self.hasher.verify, self._dummy, password) is None:
+                return BUSY
+            valid = False
+        else:
+            valid = self._run(self.hasher.verify, row[0], password)
+            if valid is None:
+                return BUSY
+
+        if not valid:
+            self.counters.inc(event='failures')
+            self.throttle.failed(ip, username)
+            return INVALID
+
+        self.counters.inc(event='logins')
+        self.throttle.succeeded(ip, username)
+        if self.hasher.needs_rehash(row[0]):
+            new_hash = self._run(self.hasher.hash, password)
+            if new_hash is not None:
+                conn.execute("UPDATE users SET password = ? WHERE username = ?", (new_hash, username))
+                conn.commit()
+                self.counters.inc(event='rehashed')
+        return OK
+
+    def stats(self):
+        return dict(self.counters.counts(*AUTH_EVENTS), **self.throttle.stats(), workers=self.workers,
+                    max_pending=self.max_pending, scrypt_n=self.hasher.n)
@@ -0,0 +1,131 @@
+"""Logins per second at each scrypt cost
+
+    python benchmarks/bench_auth.py                                  # costs 2**12 .. 2**15
+    python benchmarks/bench_auth.py --costs 14 16 --concurrency 16 --seconds 10
+    AUTH_WORKERS=4 python benchmarks/bench_auth.py --output auth.json
+
+For each cost, --concurrency clients log in through the Flask test client
+for --seconds, as users whose hashes were made at that cost. The report has
+successful logins per second, p50/p95 latency and how many logins were
+turned away because the hashing queue was full. Then one client sends
+failed logins for a single account to measure how cheaply the throttle
+rejects a credential-stuffing burst once it kicks in.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench-password'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def bench_cost(web, auth, cost, concurrency, seconds):
+    web.authenticator.hasher = auth.PasswordHasher(n=2 ** cost)
+    usernames = [f"bench-{cost}-{i}" for i in range(concurrency)]
+    with web.db.connection() as conn:
+        conn.executemany("INSERT OR REPLACE INTO users (username, email, password) VALUES (?, ?, ?)",
+                         [(name, f"{name}@bench.local", web.authenticator.hasher.hash(PASSWORD))
+                          for name in usernames])
+        conn.commit()
+
+    latencies, outcomes = [], {'ok': 0, 'busy': 0, 'other': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(username):
+        client = web.app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': username, 'password': PASSWORD})
+            elapsed = time.perf_counter() - start
+            outcome = ('ok' if response.status_code == 302 and response.location.endswith('/dashboard')
+                       else 'busy' if response.status_code == 503 else 'other')
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(name,)) for name in usernames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return dict(outcomes,
+                scrypt_n=2 ** cost,
+                hash_ms=round(timed_hash(web.authenticator.hasher) * 1000, 1),
+                logins_per_sec=round(outcomes['ok'] / elapsed, 1),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 1),
+                p95_ms=round(percentile(latencies, 0.95) * 1000, 1))
+
+
+def timed_hash(hasher, rounds=3):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        hasher.hash(PASSWORD)
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_throttle(web, attempts):
+    """Failed logins against one account; all but the first few never reach a hash"""
+    client = web.app.test_client()
+    statuses = {}
+    start = time.perf_counter()
+    for _ in range(attempts):
+        status = client.post('/login', data={'username': 'stuffed', 'password': 'guess'}).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    return {'attempts': attempts, 'statuses': statuses,
+            'attempts_per_sec': round(attempts / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--costs', type=int, nargs='+', default=[12, 13, 14, 15],
+                        help="log2 of the scrypt N parameter to try")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0, help="per cost")
+    parser.add_argument('--throttle-attempts', type=int, default=2000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['INTERVIEW_DB'] = os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('MODEL_DIR', os.path.join(workdir, 'models'))
+    os.environ.setdefault('FEATURE_DIR', os.path.join(workdir, 'features'))
+    os.environ.setdefault('LEETCODE_DIR', os.path.join(workdir, 'leetcode'))
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import app as web
+    import auth
+
+    web.init_db()
+    report = {'workers': web.authenticator.workers, 'max_pending': web.authenticator.max_pending,
+              'concurrency': args.concurrency, 'costs': []}
+    for cost in args.costs:
+        result = bench_cost(web, auth, cost, args.concurrency, args.seconds)
+        print(f"N=2**{cost}: {result['hash_ms']} ms/hash, {result['logins_per_sec']} logins/s, "
+              f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, busy {result['busy']}",
+              file=sys.stderr)
+        report['costs'].append(result)
+    report['throttle'] = bench_throttle(web, args.throttle_attempts)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
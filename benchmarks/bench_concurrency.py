@@ -0,0 +1,303 @@
+"""Sync workers against the async (ASGI) mode, with and without idle event streams
+
+    python benchmarks/bench_concurrency.py                            # 1000 idle streams
+    python benchmarks/bench_concurrency.py --idle 5000 --seconds 20 --concurrency 16
+    python benchmarks/bench_concurrency.py --modes async --workers 2 --output concurrency.json
+
+Seeds a scratch database as bench_routes.py does and starts a stub model
+server that never answers in time, so feedback jobs stay running. Then for
+each mode it starts gunicorn with gunicorn.conf.py (SERVER_MODE=sync or
+async, with the config's worker counts unless --workers is given) and runs
+two phases:
+
+  baseline  --concurrency clients send bench_routes.py's route mix for --seconds
+  idle      --idle connections wait on /feedback/<job_id>/events for a running
+            job while the same route mix runs again
+
+Each phase reports throughput of successful responses, p50/p95/p99 latency
+and errors (5xx, and requests that took longer than --request-timeout).
+The idle phase adds how many streams got their response headers and how
+many the server dropped, and both add the server's RSS and thread count.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_routes import PASSWORD, HttpDriver, percentile, route_mix, seed  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, proc, timeout=60):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            requests.get(base_url + '/login', timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"server not up after {timeout}s")
+
+
+def server_usage(pid):
+    """Total RSS (MB) and threads of a gunicorn master and its workers"""
+    pids = [pid]
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    pids.append(int(entry))
+        except OSError:
+            continue
+    rss_kb = threads = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss_kb += int(line.split()[1])
+                    elif line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+        except OSError:
+            continue
+    return {'server_rss_mb': round(rss_kb / 1024, 1), 'server_threads': threads,
+            'server_processes': len(pids)}
+
+
+def run_load(base_url, seconds, concurrency, users, timeout, seed_value):
+    """The route mix from --concurrency logged-in clients until the time is up"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(index):
+        rng = random.Random(seed_value + index)
+        driver = HttpDriver(base_url, timeout)
+        mix = route_mix(rng, {})
+        weights = [entry[0] for entry in mix]
+        request = ('POST', '/login', None)
+        form = {'username': f"bench{rng.randrange(users)}", 'password': PASSWORD}
+        while time.monotonic() < deadline:
+            method, path, body = request
+            start = time.perf_counter()
+            try:
+                status, _ = driver.send(method, path, body, form)
+                error = status >= 500
+            except Exception:
+                error = True
+            with lock:
+                samples.append((time.perf_counter() - start, error))
+            request, form = rng.choices(mix, weights)[0][3](), None
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    errors = sum(1 for _, error in samples if error)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round((len(samples) - errors) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+    }
+
+
+class IdleStreams:
+    """Connections waiting on a feedback job's event stream, held from an event loop thread"""
+
+    def __init__(self, port, cookie, job_id, count, connect_timeout):
+        self.port = port
+        self.request = (f"GET /feedback/{job_id}/events HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                        f"Cookie: session={cookie}\r\nAccept: text/event-stream\r\n\r\n").encode()
+        self.count = count
+        self.connect_timeout = connect_timeout
+        self.counters = {'streaming': 0, 'refused': 0, 'dropped': 0}
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+
+    def open(self):
+        """Open the streams; returns once each got headers or failed, or after connect_timeout"""
+        self._thread.start()
+        self._ready.wait()
+        return dict(self.counters, waiting=self.count - self.counters['streaming'] - self.counters['refused'])
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+        return dict(self.counters)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._loop.call_later(self.connect_timeout, self._ready.set)
+        connecting = asyncio.Semaphore(200)  # stay under the listen backlog
+        tasks = [asyncio.create_task(self._hold(connecting)) for _ in range(self.count)]
+        await self._stop.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _settled(self):
+        if self.counters['streaming'] + self.counters['refused'] >= self.count:
+            self._ready.set()
+
+    async def _hold(self, connecting):
+        writer = None
+        try:
+            async with connecting:
+                reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.write(self.request)
+                await writer.drain()
+            status = await reader.readline()
+            if not status.startswith(b'HTTP/1.1 200'):
+                self.counters['refused'] += 1
+                return
+            self.counters['streaming'] += 1
+            self._settled()
+            while await reader.read(4096):
+                pass
+            self.counters['dropped'] += 1  # the server ended the stream
+        except OSError:
+            self.counters['refused'] += 1
+        finally:
+            self._settled()
+            if writer is not None:
+                writer.close()
+
+
+def bench_mode(mode, args, env, users):
+    import requests
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(env, SERVER_MODE=mode, BIND=f"127.0.0.1:{port}")
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    log_path = os.path.join(args.workdir, f"gunicorn-{mode}.log")
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                                cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_up(base_url, proc)
+        report = {'mode': mode, 'log': log_path}
+        report['baseline'] = dict(run_load(base_url, args.seconds, args.concurrency, users,
+                                           args.request_timeout, args.seed), **server_usage(proc.pid))
+        print(f"{mode} baseline: {report['baseline']}", file=sys.stderr)
+
+        # A job that stays running for the idle streams to wait on
+        session = requests.Session()
+        session.post(base_url + '/login', data={'username': 'bench0', 'password': PASSWORD}, timeout=30)
+        job = session.post(base_url + '/feedback', timeout=30, json={
+            'problem_slug': 'two-sum', 'code': f"# {mode} {time.time()}\nprint('idle')"}).json()
+
+        streams = IdleStreams(port, session.cookies.get('session'), job['job_id'], args.idle,
+                              args.connect_timeout)
+        opened = streams.open()
+        load = run_load(base_url, args.seconds, args.concurrency, users, args.request_timeout, args.seed)
+        usage = server_usage(proc.pid)
+        closed = streams.close()
+        report['idle'] = dict(load, idle_streams=args.idle, streams_opened=opened['streaming'],
+                              streams_waiting_for_headers=opened['waiting'],
+                              streams_refused=closed['refused'], streams_dropped=closed['dropped'],
+                              **usage)
+        print(f"{mode} with {args.idle} idle streams: {report['idle']}", file=sys.stderr)
+        return report
+    finally:
+        proc.send_signal(signal.SIGINT)  # quick shutdown; waiting streams would hold a graceful one
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', nargs='+', choices=['sync', 'async'], default=['sync', 'async'])
+    parser.add_argument('--idle', type=int, default=1000, help="idle event streams in the second phase")
+    parser.add_argument('--concurrency', type=int, default=8, help="clients sending the route mix")
+    parser.add_argument('--seconds', type=float, default=10.0, help="per phase")
+    parser.add_argument('--workers', type=int, help="gunicorn workers (default: gunicorn.conf.py's)")
+    parser.add_argument('--request-timeout', type=float, default=5.0)
+    parser.add_argument('--connect-timeout', type=float, default=15.0,
+                        help="how long to wait for the idle streams to get their headers")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    # Client and server sockets for every idle stream
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    args.workdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               INTERVIEW_DB=os.path.join(args.workdir, 'bench.db'),
+               MODEL_DIR=os.path.join(args.workdir, 'models'),
+               FEATURE_DIR=os.path.join(args.workdir, 'features'),
+               LEETCODE_DIR=os.path.join(args.workdir, 'leetcode'),
+               FEEDBACK_TIMEOUT='3600',
+               FEEDBACK_EVENTS_TIMEOUT='3600')
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import app as web
+    import db
+
+    web.init_db()
+    with db.connection() as conn:
+        seeded = seed(conn, args.rows, random.Random(args.seed))
+    db.pool.close_all()
+    print(f"Seeded {seeded}", file=sys.stderr)
+
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'stub_model_server.py'),
+                             '--port', str(stub_port), '--latency', '3600'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    env['FEEDBACK_API_URL'] = f"http://127.0.0.1:{stub_port}/v1/chat/completions"
+    try:
+        report = {'cpus': os.cpu_count(), 'concurrency': args.concurrency, 'seconds': args.seconds,
+                  'idle': args.idle, 'rows': args.rows,
+                  'modes': [bench_mode(mode, args, env, seeded['users']) for mode in args.modes]}
+    finally:
+        stub.kill()
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare per-item and batch prediction paths on a synthetic database
+
+    python benchmarks/bench_predictions.py [--users 2000] [--pairs 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=2000)
+parser.add_argument('--pairs', type=int, default=5000)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ['INTERVIEW_DB'] = os.path.join(workdir, 'bench.db')
+os.environ['MODEL_DIR'] = os.path.join(workdir, 'models')
+os.environ['FEATURE_DIR'] = os.path.join(workdir, 'features')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import ml_models  # noqa: E402
+import db  # noqa: E402
+import user_stats  # noqa: E402
+
+TOPICS = ["Percentages", "Time and Work", "Profit and Loss"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+CODING_TOPICS = ["array", "string", "graph"]
+
+
+def seed(users):
+    rng = random.Random(42)
+    app.init_db()
+    with db.connection() as conn:
+        for i in range(users):
+            username = f"user{i}"
+            for _ in range(rng.randint(0, 6)):
+                user_stats.record_aptitude_result(conn, username, rng.choice(TOPICS),
+                                                  rng.randint(0, 10), 10)
+            for _ in range(rng.randint(0, 6)):
+                user_stats.record_coding_attempt(conn, username, rng.choice(CODING_TOPICS),
+                                                 rng.choice(DIFFICULTIES),
+                                                 rng.randint(60, 2400), rng.random() < 0.7)
+        conn.commit()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+seed(args.users)
+ml_models.performance_model.retrain()
+predictor = ml_models.performance_model.current
+recommender = ml_models.difficulty_recommender
+
+rng = random.Random(7)
+usernames = [f"user{rng.randrange(args.users)}" for _ in range(args.pairs)]
+topics = [rng.choice(TOPICS) for _ in range(args.pairs)]
+coding_topics = [rng.choice(CODING_TOPICS) for _ in range(args.pairs)]
+
+single, single_time = timed(lambda: [predictor.predict_performance(u, t)
+                                     for u, t in zip(usernames, topics)])
+batch, batch_time = timed(lambda: predictor.predict_performance_batch(usernames, topics))
+assert all(abs(a - b) < 1e-6 for a, b in zip(single, batch))
+print(f"predict_performance  {args.pairs} pairs: per-item {single_time:.3f}s, "
+      f"batch {batch_time:.3f}s, speedup {single_time / batch_time:.1f}x")
+
+single, single_time = timed(lambda: [recommender.recommend_difficulty(u, t)
+                                     for u, t in zip(usernames, coding_topics)])
+batch, batch_time = timed(lambda: recommender.recommend_difficulty_batch(usernames, coding_topics))
+assert single == batch
+print(f"recommend_difficulty {args.pairs} pairs: per-item {single_time:.3f}s, "
+      f"batch {batch_time:.3f}s, speedup {single_time / batch_time:.1f}x")
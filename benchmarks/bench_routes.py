@@ -0,0 +1,314 @@
+"""Load-test the Flask routes against a seeded database
+
+    python benchmarks/bench_routes.py                                # 10k rows, test client
+    python benchmarks/bench_routes.py --rows 1000000 --mode http --concurrency 16
+    python benchmarks/bench_routes.py --output routes.json           # save the report
+    python benchmarks/bench_routes.py --baseline routes.json         # fail on regressions
+
+Seeds a fresh database (never interview_data.db itself unless --db points
+there) with synthetic users, quiz history, coding attempts and notes, split
+from --rows. Then --concurrency workers, each logged in as a seeded user,
+send --requests requests drawn from a weighted mix of routes. They go
+through the Flask test client (--mode client) or over HTTP to a threaded
+werkzeug server started in-process (--mode http).
+
+The JSON report has per-route p50/p95/p99 latency and error counts, overall
+throughput and peak RSS, plus the routes the mix does not exercise.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APTITUDE_TOPICS = [("percentages", "Percentages"), ("time-and-work", "Time and Work"),
+                   ("profit-and-loss", "Profit and Loss")]
+CODING_TOPICS = ["array", "string", "hash-table", "graph", "tree", "dynamic-programming"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+NOTE_WORDS = ("graph tree heap array pointer window stack queue dynamic programming "
+              "binary search sorting greedy recursion memo hash interval matrix").split()
+PASSWORD = 'bench-password'
+
+
+def seed(conn, rows, rng):
+    """Fill the tables from a row budget: 40% quizzes, 40% coding attempts, 20% notes"""
+    import user_stats
+
+    users = max(10, rows // 100)
+    counts = {'users': users, 'aptitude_progress': rows * 2 // 5,
+              'coding_attempts': rows * 2 // 5, 'notes': rows // 5}
+    started = time.perf_counter()
+
+    conn.executemany("INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+                     ((f"bench{i}", f"bench{i}@example.com", PASSWORD) for i in range(users)))
+
+    def stamp():
+        return f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+
+    conn.executemany("""
+        INSERT INTO aptitude_progress (username, topic, score, total_questions, timestamp)
+        VALUES (?, ?, ?, 10, ?)
+    """, ((f"bench{rng.randrange(users)}", rng.choice(APTITUDE_TOPICS)[1], rng.randint(0, 10), stamp())
+          for _ in range(counts['aptitude_progress'])))
+    conn.executemany("""
+        INSERT INTO coding_attempts (username, topic, difficulty, time_spent, completed, hints_used, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, ((f"bench{rng.randrange(users)}", rng.choice(CODING_TOPICS), rng.choice(DIFFICULTIES),
+           rng.randint(60, 2400), rng.random() < 0.7, rng.randint(0, 3), stamp())
+          for _ in range(counts['coding_attempts'])))
+    conn.executemany("""
+        INSERT INTO notes (username, title, content, category, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, ((f"bench{rng.randrange(users)}", ' '.join(rng.sample(NOTE_WORDS, 3)).title(),
+           ' '.join(rng.choices(NOTE_WORDS, k=rng.randint(20, 200))),
+           rng.choice(['General', 'DSA', 'Coding', 'System Design']), stamp(), stamp())
+          for _ in range(counts['notes'])))
+    conn.commit()
+
+    # Rebuild the per-user rollups from the raw rows just inserted
+    user_stats.backfill(conn)
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def route_mix(rng, state):
+    """Weighted (weight, name, endpoint, request) entries; request() -> (method, path, json)"""
+    def quiz_topic():
+        return rng.choice(APTITUDE_TOPICS[:2])[0]
+
+    def answer():
+        topic, index = state.get('quiz', (quiz_topic(), 0))
+        return 'POST', f'/api/quiz/{topic}/answer', {'index': index, 'answer': '50'}
+
+    def track():
+        return 'POST', '/track-coding-attempt', {
+            'topic': rng.choice(CODING_TOPICS), 'difficulty': rng.choice(DIFFICULTIES),
+            'time_spent': rng.randint(60, 2400), 'completed': rng.random() < 0.7}
+
+    return [
+        (5, 'dashboard', 'dashboard', lambda: ('GET', '/dashboard', None)),
+        (3, 'practice', 'practice', lambda: ('GET', '/practice', None)),
+        (3, 'aptitude', 'aptitude', lambda: ('GET', '/aptitude', None)),
+        (2, 'learn', 'learn', lambda: ('GET', f'/learn/{quiz_topic()}', None)),
+        (2, 'learn-formulas', 'learn_topic', lambda: ('GET', f'/aptitude/learn/{quiz_topic()}', None)),
+        (2, 'me', 'whoami', lambda: ('GET', '/api/me', None)),
+        (2, 'get-dynamic-question', 'get_dynamic_question', lambda: (
+            'GET', f'/get-dynamic-question?topic={rng.choice(CODING_TOPICS)}'
+                   f'&difficulty={rng.choice(DIFFICULTIES)}', None)),
+        (2, 'get-dynamic-questions', 'get_dynamic_questions', lambda: (
+            'POST', '/get-dynamic-questions', {
+                'k': 5, 'pairs': [{'topic': rng.choice(CODING_TOPICS), 'difficulty': rng.choice(DIFFICULTIES)}
+                                  for _ in range(3)]})),
+        (2, 'daily-question', 'get_daily_question', lambda: ('GET', '/daily-question', None)),
+        (8, 'solve', 'solve', lambda: ('GET', f'/solve/{quiz_topic()}', None)),
+        (4, 'quiz-current', 'quiz_current', lambda: ('GET', f'/api/quiz/{quiz_topic()}', None)),
+        (8, 'quiz-answer', 'quiz_answer', answer),
+        (8, 'notes', 'notes', lambda: ('GET', '/notes', None)),
+        (4, 'notes-search', 'search_notes', lambda: (
+            'GET', f'/notes/search?q={rng.choice(NOTE_WORDS)}', None)),
+        (3, 'notes-api', 'notes_api', lambda: ('GET', '/api/notes?limit=30', None)),
+        (6, 'ml-insights', 'ml_insights', lambda: ('GET', '/ml-insights', None)),
+        (10, 'track-coding-attempt', 'track_coding_attempt', track),
+        (2, 'track-coding-attempts', 'track_coding_attempts', lambda: (
+            'POST', '/track-coding-attempts', {'events': [track()[2] for _ in range(10)]})),
+    ]
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, body=None, form=None):
+        response = self.client.open(path, method=method, json=body, data=form)
+        data = response.get_data()
+        response.close()
+        return response.status_code, data
+
+
+class HttpDriver:
+    def __init__(self, base_url, timeout=60):
+        import requests
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, method, path, body=None, form=None):
+        response = self.session.request(method, self.base_url + path, json=body, data=form,
+                                        allow_redirects=False, timeout=self.timeout)
+        return response.status_code, response.content
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def worker(make_driver, worker_id, users, requests_per_worker, samples, seed):
+    rng = random.Random(seed + worker_id)
+    driver = make_driver()
+    state = {}
+
+    def timed(name, method, path, body=None, form=None):
+        start = time.perf_counter()
+        try:
+            status, data = driver.send(method, path, body, form)
+            error = status >= 500
+        except Exception:
+            status, data, error = None, b'', True
+        samples.setdefault(name, []).append((time.perf_counter() - start, error))
+        return status, data
+
+    timed('login', 'POST', '/login',
+          form={'username': f"bench{rng.randrange(users)}", 'password': PASSWORD})
+
+    mix = route_mix(rng, state)
+    weights = [entry[0] for entry in mix]
+    for _ in range(requests_per_worker):
+        _, name, _, request = rng.choices(mix, weights)[0]
+        method, path, body = request()
+        status, data = timed(name, method, path, body)
+        if name in ('quiz-current', 'quiz-answer') and status in (200, 409):
+            # Keep answering the question the server expects next
+            step = json.loads(data)
+            if 'index' in step:
+                state['quiz'] = (path.split('/')[3], step['index'])
+            else:
+                state.pop('quiz', None)
+
+
+def run(app, mode, concurrency, requests_per_worker, users, seed):
+    server = None
+    if mode == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        make_driver = lambda: HttpDriver(base_url)  # noqa: E731
+    else:
+        make_driver = lambda: TestClientDriver(app)  # noqa: E731
+
+    per_worker = [{} for _ in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(make_driver, i, users, requests_per_worker,
+                                                     per_worker[i], seed))
+               for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    samples = {}
+    for worker_samples in per_worker:
+        for name, values in worker_samples.items():
+            samples.setdefault(name, []).extend(values)
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for name, values in sorted(samples.items()):
+        latencies = sorted(latency * 1000 for latency, _ in values)
+        routes[name] = {
+            'count': len(values),
+            'errors': sum(1 for _, error in values if error),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+        }
+    total = sum(route['count'] for route in routes.values())
+    return {
+        'requests': total,
+        'errors': sum(route['errors'] for route in routes.values()),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'routes': routes,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against a saved report: slower p95 per route, or lower throughput"""
+    regressions = []
+    for name, route in report['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before and route['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name} p95_ms: {before['p95_ms']:.1f} -> {route['p95_ms']:.1f}")
+    if report['throughput_rps'] < baseline.get('throughput_rps', 0) * (1 - tolerance):
+        regressions.append(f"throughput_rps: {baseline['throughput_rps']:.1f} -> "
+                           f"{report['throughput_rps']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000, help="rows to seed across all tables")
+    parser.add_argument('--mode', choices=['client', 'http'], default='client')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help="total requests (after logins)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help="database to seed (default: a fresh temporary one)")
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    # Keep the model refresh thread and every other artifact in a scratch directory
+    workdir = tempfile.mkdtemp()
+    os.environ['INTERVIEW_DB'] = args.db or os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('MODEL_DIR', os.path.join(workdir, 'models'))
+    os.environ.setdefault('FEATURE_DIR', os.path.join(workdir, 'features'))
+    os.environ.setdefault('LEETCODE_DIR', os.path.join(workdir, 'leetcode'))
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import app as web
+    import db
+
+    web.init_db()
+    with db.connection() as conn:
+        seeded = seed(conn, args.rows, random.Random(args.seed))
+    print(f"Seeded {seeded}", file=sys.stderr)
+
+    requests_per_worker = max(1, args.requests // args.concurrency)
+    samples, elapsed = run(web.app, args.mode, args.concurrency, requests_per_worker,
+                           seeded['users'], args.seed)
+    web.ingest_queue.drain()
+
+    exercised = {entry[2] for entry in route_mix(random.Random(), {})} | {'login'}
+    report = dict(summarize(samples, elapsed),
+                  mode=args.mode,
+                  concurrency=args.concurrency,
+                  rows=args.rows,
+                  seeded=seeded,
+                  peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                  uncovered_routes=sorted(rule.rule for rule in web.app.url_map.iter_rules()
+                                          if rule.endpoint not in exercised
+                                          and rule.endpoint != 'static'))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
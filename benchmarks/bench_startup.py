@@ -0,0 +1,86 @@
+"""Track worker startup cost: import time (python -X importtime) and baseline RSS
+
+    python benchmarks/bench_startup.py                          # print a report
+    python benchmarks/bench_startup.py --output startup.json    # save it
+    python benchmarks/bench_startup.py --baseline startup.json  # fail on regressions
+
+Each measurement runs in a fresh interpreter, importing the module the way a
+gunicorn worker would. The median of --runs is reported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the child's own peak RSS in KiB once the import is done
+RSS_PROBE = "import resource, {module}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def measure(module, env):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', RSS_PROBE.format(module=module)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumul, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            cumulative[name.strip()] = int(cumul)
+    top = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+    return {
+        'import_ms': cumulative[module] / 1000,
+        'rss_mb': int(result.stdout.split()[-1]) / 1024,
+        'slowest_top_level': [(name, us / 1000) for name, us in top[:8]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--preload-ml', action='store_true', help="measure with PRELOAD_ML=1")
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    # Keep the model refresh thread away from the real database and artifacts
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PRELOAD_ML='1' if args.preload_ml else '0',
+               INTERVIEW_DB=os.path.join(workdir, 'bench.db'),
+               MODEL_DIR=os.path.join(workdir, 'models'),
+               FEATURE_DIR=os.path.join(workdir, 'features'))
+    runs = [measure(args.module, env) for _ in range(args.runs)]
+    report = {
+        'module': args.module,
+        'preload_ml': args.preload_ml,
+        'import_ms': statistics.median(run['import_ms'] for run in runs),
+        'rss_mb': statistics.median(run['rss_mb'] for run in runs),
+        'slowest_top_level': runs[-1]['slowest_top_level'],
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [key for key in ('import_ms', 'rss_mb')
+                       if report[key] > baseline[key] * (1 + args.tolerance)]
+        for key in regressions:
+            print(f"REGRESSION {key}: {baseline[key]:.1f} -> {report[key]:.1f}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
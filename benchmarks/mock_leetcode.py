@@ -0,0 +1,106 @@
+"""Local stand-in for LeetCode's GraphQL API, for running leetcode_sync.py offline
+
+    python benchmarks/mock_leetcode.py --port 8765 --problems 3000 --fail-rate 0.1
+    LEETCODE_DIR=/tmp/leetcode python leetcode_sync.py --url http://127.0.0.1:8765/graphql
+
+Answers the catalogue and daily-challenge queries with generated problems,
+sends ETags and honours If-None-Match, and fails --fail-rate of requests
+with a 429 or 503 so retries get exercised. Request counts are printed on
+exit.
+"""
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TAGS = ["array", "string", "hash-table", "math", "dynamic-programming", "sorting", "greedy",
+        "tree", "binary-search", "linked-list", "stack", "graph", "two-pointers", "sliding-window"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+def make_problems(count, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'title': f"Problem {i}",
+        'titleSlug': f"problem-{i}",
+        'difficulty': rng.choice(DIFFICULTIES),
+        'isPaidOnly': rng.random() < 0.1,
+        'topicTags': [{'slug': tag} for tag in rng.sample(TAGS, rng.randint(1, 3))]
+    } for i in range(1, count + 1)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    problems = []
+    fail_rate = 0.0
+    counts = collections.Counter()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        variables = payload.get('variables') or {}
+
+        if random.random() < self.fail_rate:
+            self.counts['failed'] += 1
+            status = random.choice([429, 503])
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+
+        if 'activeDailyCodingChallengeQuestion' in payload['query']:
+            today = datetime.date.today()
+            question = self.problems[today.toordinal() % len(self.problems)]
+            data = {'activeDailyCodingChallengeQuestion': {
+                'date': today.isoformat(),
+                'link': f"/problems/{question['titleSlug']}/",
+                'question': question}}
+        else:
+            skip, limit = variables.get('skip', 0), variables.get('limit', 50)
+            data = {'problemsetQuestionList': {
+                'total': len(self.problems),
+                'questions': self.problems[skip:skip + limit]}}
+
+        body = json.dumps({'data': data}).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.counts['not_modified'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.counts['ok'] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--problems', type=int, default=3000)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    Handler.problems = make_problems(args.problems)
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f"Mock LeetCode GraphQL on http://127.0.0.1:{args.port}/graphql")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(dict(Handler.counts))
+
+
+if __name__ == '__main__':
+    main()
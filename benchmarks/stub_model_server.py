@@ -0,0 +1,75 @@
+"""Local stand-in for an OpenAI-compatible chat completions API, for the feedback jobs
+
+    python benchmarks/stub_model_server.py --port 8766 --latency 3
+    FEEDBACK_API_URL=http://127.0.0.1:8766/v1/chat/completions python app.py
+
+Replies after --latency seconds with canned feedback that quotes the
+problem and the size of the code, and fails --fail-rate of calls with a
+500. The number of model calls is printed on exit, which shows how many
+submissions were coalesced or served from the cache.
+"""
+import argparse
+import collections
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    counts = collections.Counter()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        prompt = payload['messages'][-1]['content']
+        time.sleep(self.latency)
+
+        if random.random() < self.fail_rate:
+            self.counts['failed'] += 1
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        self.counts['ok'] += 1
+        header = prompt.split('\n\n', 1)[0].replace('\n', ', ')
+        content = (f"- Reviewed {header} ({len(prompt.split(chr(10) * 2, 1)[-1])} chars of code).\n"
+                   "- Looks correct for the sample cases.\n"
+                   "- Consider the empty-input edge case.")
+        body = json.dumps({
+            'id': f"stub-{self.counts['ok']}",
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                         'finish_reason': 'stop'}]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=2.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    Handler.latency = args.latency
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    print(f"Stub model server on http://127.0.0.1:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(dict(Handler.counts))
+
+
+if __name__ == '__main__':
+    main()
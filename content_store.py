@@ -0,0 +1,194 @@
+"""Aptitude topics, learning material and the question bank
+
+Content lives in SQLite (aptitude_topics, aptitude_questions) and is
+authored as one JSON file per topic in CONTENT_DIR, named <slug>.json:
+
+    {"title": "...", "formulas": "<html>", "material": "<html>",
+     "questions": [{"question": "...", "options": [...], "answer": "...",
+                    "difficulty": "easy|medium|hard"}]}
+
+Adding or editing a file needs no restart. Workers stat the directory every
+check_interval seconds, and the first to see a change re-imports that topic
+and bumps content_meta.version, which tells every worker to reload.
+
+Workers only keep question ids in memory, as one int array per topic and
+difficulty. A quiz draws N ids with random.sample in O(N) and fetches just
+those rows, so memory stays flat as the bank grows.
+"""
+import array
+import json
+import os
+import random
+import threading
+import time
+
+import db
+
+CONTENT_DIR = os.environ.get('CONTENT_DIR', os.path.join('content', 'aptitude'))
+
+
+def scan(directory=CONTENT_DIR):
+    """{slug: (path, fingerprint)} for every topic file; fingerprint is mtime and size"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return {}
+    files = {}
+    for name in names:
+        if name.endswith('.json'):
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            files[name[:-len('.json')]] = (path, f"{stat.st_mtime_ns}:{stat.st_size}")
+    return files
+
+
+def import_topic(conn, slug, data, fingerprint=None):
+    """Replace one topic's content (the caller commits).
+
+    Questions are matched on their text, so unchanged questions keep their
+    ids and quizzes in progress survive an edit.
+    """
+    conn.execute("""
+        INSERT OR REPLACE INTO aptitude_topics (slug, title, formulas, material, source_fingerprint)
+        VALUES (?, ?, ?, ?, ?)
+    """, (slug, data['title'], data.get('formulas'), data.get('material'), fingerprint))
+
+    existing = dict(conn.execute("SELECT question, id FROM aptitude_questions WHERE topic = ?", (slug,)))
+    for q in data.get('questions', []):
+        row = (str(q.get('difficulty', 'medium')).lower(),
+               json.dumps(q['options'], ensure_ascii=False), q['answer'])
+        question_id = existing.pop(q['question'], None)
+        if question_id is None:
+            conn.execute("""
+                INSERT INTO aptitude_questions (topic, difficulty, options, answer, question)
+                VALUES (?, ?, ?, ?, ?)
+            """, (slug,) + row + (q['question'],))
+        else:
+            conn.execute("""
+                UPDATE aptitude_questions SET difficulty = ?, options = ?, answer = ? WHERE id = ?
+            """, row + (question_id,))
+    # Whatever is left was removed from the file
+    conn.executemany("DELETE FROM aptitude_questions WHERE id = ?",
+                     ((question_id,) for question_id in existing.values()))
+
+
+def sync_directory(conn, files):
+    """Import topic files whose fingerprint changed and drop topics whose file was removed.
+
+    Runs under BEGIN IMMEDIATE, so when several workers notice the same
+    change only the first imports it. Returns the changed slugs.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = dict(conn.execute("SELECT slug, source_fingerprint FROM aptitude_topics"))
+        changed = []
+        for slug, (path, fingerprint) in files.items():
+            if stored.get(slug) == fingerprint:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    import_topic(conn, slug, json.load(f), fingerprint)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Error importing aptitude content {path}: {e!r}")
+                continue
+            changed.append(slug)
+        # Only topics that came from a file are removed with it
+        for slug in stored.keys() - files.keys():
+            if stored[slug] is not None:
+                conn.execute("DELETE FROM aptitude_questions WHERE topic = ?", (slug,))
+                conn.execute("DELETE FROM aptitude_topics WHERE slug = ?", (slug,))
+                changed.append(slug)
+        if changed:
+            conn.execute("UPDATE content_meta SET value = value + 1 WHERE key = 'version'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return changed
+
+
+class ContentStore:
+    def __init__(self, directory=CONTENT_DIR, check_interval=2.0, on_reload=None):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.on_reload = on_reload
+        self.version = None
+        self._files = None
+        self._titles = {}
+        self._ids = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Import edited files and reload the index if content changed; True if it reloaded"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        with self._lock, db.connection() as conn:
+            files = scan(self.directory)
+            if files != self._files:
+                sync_directory(conn, files)
+                self._files = files
+            version = conn.execute("SELECT value FROM content_meta WHERE key = 'version'").fetchone()[0]
+            if version == self.version:
+                return False
+            self._load(conn)
+            self.version = version
+        if self.on_reload:
+            self.on_reload()
+        return True
+
+    def _load(self, conn):
+        titles = dict(conn.execute("SELECT slug, title FROM aptitude_topics ORDER BY title"))
+        ids = {}
+        for topic, difficulty, question_id in conn.execute(
+                "SELECT topic, difficulty, id FROM aptitude_questions ORDER BY topic, difficulty, id"):
+            ids.setdefault((topic, difficulty), array.array('q')).append(question_id)
+            ids.setdefault((topic, None), array.array('q')).append(question_id)
+        # Swap both at once so readers never see a partial index
+        self._titles, self._ids = titles, ids
+
+    def topics(self):
+        """[{'slug', 'title', 'questions'}] ordered by title"""
+        self.refresh()
+        return [{'slug': slug, 'title': title, 'questions': len(self._ids.get((slug, None), ()))}
+                for slug, title in self._titles.items()]
+
+    def titles(self):
+        """Topic titles ordered by title; quiz results are recorded under these"""
+        self.refresh()
+        return list(self._titles.values())
+
+    def topic(self, slug):
+        """A topic's title and learning content, or None if there is no such topic"""
+        self.refresh()
+        if slug not in self._titles:
+            return None
+        with db.connection() as conn:
+            row = conn.execute("SELECT title, formulas, material FROM aptitude_topics WHERE slug = ?",
+                               (slug,)).fetchone()
+        if row is None:
+            return None
+        return {'slug': slug, 'title': row[0], 'formulas': row[1], 'material': row[2],
+                'questions': len(self._ids.get((slug, None), ()))}
+
+    def sample(self, slug, n, difficulty=None):
+        """Up to n distinct random question ids for a topic, in O(n)"""
+        self.refresh()
+        pool = self._ids.get((slug, difficulty.lower() if difficulty else None), ())
+        return [pool[i] for i in random.sample(range(len(pool)), min(n, len(pool)))]
+
+    def question(self, conn, question_id):
+        """One question without its answer, or None if it was removed"""
+        row = conn.execute("""
+            SELECT id, question, options, difficulty FROM aptitude_questions WHERE id = ?
+        """, (question_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'question': row[1], 'options': json.loads(row[2]), 'difficulty': row[3]}
+
+
+# One store per process, shared by the views and the ML models
+store = ContentStore()
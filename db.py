@@ -0,0 +1,129 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+DATABASE = os.environ.get('INTERVIEW_DB', 'interview_data.db')
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, and busy_timeout makes writers wait for the lock instead of failing
+# with "database is locked".
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections"""
+
+    def __init__(self, path=DATABASE, max_size=8, timeout=30.0, factory=sqlite3.Connection):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        # Connection class for new connections (instrumentation swaps in a timed one)
+        self.factory = factory
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+
+    def _connect(self):
+        # Connections outlive a single statement now, so sqlite3's per-connection
+        # statement cache gives us prepared-statement reuse across requests.
+        conn = sqlite3.connect(self.path, timeout=self.timeout,
+                               check_same_thread=False, cached_statements=256,
+                               factory=self.factory)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening one if the pool has spare capacity"""
+        if self._pid != os.getpid():
+            # Never share SQLite handles with a forked worker
+            self._reset()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError("Timed out waiting for a database connection")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool(DATABASE)
+
+
+def get_db():
+    """Return the connection checked out for the current app context"""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+@contextmanager
+def connection():
+    """Use the request's connection inside Flask, or borrow one from the pool outside it"""
+    if has_app_context():
+        yield get_db()
+        return
+
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def query_in_batches(conn, sql, values, batch_size=500):
+    """Run sql once per batch of values, filling {placeholders} with an IN (...) list.
+    
+    Batching keeps each statement well below SQLite's bound-parameter limit.
+    """
+    values = list(dict.fromkeys(values))
+    for i in range(0, len(values), batch_size):
+        chunk = values[i:i + batch_size]
+        yield from conn.execute(sql.format(placeholders=", ".join("?" * len(chunk))), chunk)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,247 @@
+"""Incrementally built, memory-mapped feature store for the performance model
+
+Every aptitude quiz becomes one training row: the features describe the
+user's history *before* that quiz and the target is the quiz's percentage.
+Quizzes and coding attempts are replayed together in timestamp order, so
+a quiz's features only include coding attempts made before it.
+Rows are appended to a row-major float64 file, so training reads them
+through np.memmap without copying. New rows are picked up by id
+watermarks on aptitude_progress and coding_attempts.
+
+The same ``history_features`` definition is used for training rows and for
+serving, where the history comes from the user_*_stats rollups instead.
+Its topic columns are the content store's aptitude topics when the store
+is built; a store or model built for another topic list is discarded.
+
+    python feature_store.py           # append features for new rows
+    python feature_store.py --rebuild # recompute the store from scratch
+"""
+import heapq
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+import db
+from content_store import store as content_store
+from user_stats import EWMA_ALPHA
+from util import atomic_write
+
+FEATURE_DIR = os.environ.get('FEATURE_DIR', 'features')
+
+# Bump when the feature definition changes; older stores and models are discarded
+FEATURE_VERSION = 3
+
+HISTORY_FEATURES = [
+    'accuracy', 'attempts', 'days_since_last',
+    'coding_avg_time', 'coding_completion_rate', 'coding_avg_hints',
+]
+
+# Recency assigned to a topic the user has never tried
+NEW_TOPIC_DAYS = 365.0
+
+
+def parse_timestamp(value):
+    """Parse SQLite's CURRENT_TIMESTAMP format"""
+    return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+
+
+def feature_names(topics):
+    """Column names: the history features, then one column per topic and one for any other"""
+    return HISTORY_FEATURES + [f'topic={topic}' for topic in topics] + ['topic=other']
+
+
+def feature_layout(topics):
+    """What stores and models must agree on: the definition's version and the topic columns"""
+    return {'version': FEATURE_VERSION, 'topics': list(topics)}
+
+
+def history_features(user_summary, topic_summary, coding_summary, topic, at, topics):
+    """The feature definition shared by training and serving.
+
+    user_summary   (score_sum, attempts) over all topics, or None
+    topic_summary  (ewma_score, attempts, last_attempt) for this topic, or None
+    coding_summary (attempts, completed, time_spent_sum, hints_used_sum), or None
+    topics         the topic columns, as in feature_layout
+    Returns None when the user has no aptitude history at all.
+    """
+    if not user_summary or not user_summary[1]:
+        return None
+
+    if topic_summary:
+        accuracy, attempts, last_attempt = topic_summary
+        days = (at - parse_timestamp(last_attempt)).total_seconds() / 86400
+        days_since_last = max(0.0, min(days, NEW_TOPIC_DAYS))
+    else:
+        # Untried topic: fall back to the user's overall average
+        accuracy = user_summary[0] / user_summary[1]
+        attempts = 0
+        days_since_last = NEW_TOPIC_DAYS
+
+    coding_attempts, completed, time_spent, hints = coding_summary or (0, 0, 0, 0)
+    if coding_attempts:
+        coding = [time_spent / coding_attempts, completed / coding_attempts, hints / coding_attempts]
+    else:
+        coding = [0.0, 0.0, 0.0]
+
+    one_hot = [1.0 if topic == t else 0.0 for t in topics]
+    one_hot.append(0.0 if topic in topics else 1.0)
+    return [accuracy, attempts, days_since_last] + coding + one_hot
+
+
+class FeatureStore:
+    def __init__(self, directory=FEATURE_DIR, topics=None):
+        self.directory = directory
+        self.topics = list(content_store.titles() if topics is None else topics)
+        self.layout = feature_layout(self.topics)
+        self.features = feature_names(self.topics)
+        self.width = len(self.features) + 1  # features plus target column
+        self._state = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_meta(self):
+        try:
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('layout') == self.layout:
+                return meta
+        except (OSError, ValueError):
+            pass
+        # New, or built for another layout: start over
+        return {'layout': self.layout, 'features': self.features, 'rows': 0,
+                'aptitude_watermark': 0, 'coding_watermark': 0}
+
+    def _load_state(self, meta):
+        if meta['rows'] or meta['aptitude_watermark']:
+            try:
+                return joblib.load(self._path('state.joblib'))
+            except (OSError, ValueError):
+                pass
+        # users: username -> [score_sum, attempts]
+        # topics: (username, topic) -> [ewma_score, attempts, last_attempt]
+        # coding: username -> [attempts, completed, time_spent_sum, hints_used_sum]
+        return {'users': {}, 'topics': {}, 'coding': {}}
+
+    def update(self):
+        """Append feature rows for quizzes newer than the watermark; returns rows added"""
+        os.makedirs(self.directory, exist_ok=True)
+        meta = self.read_meta()
+        state = self._load_state(meta)
+
+        with db.connection() as conn:
+            coding_rows = conn.execute("""
+                SELECT timestamp, id, username, completed, time_spent, hints_used
+                FROM coding_attempts WHERE id > ? ORDER BY timestamp, id
+            """, (meta['coding_watermark'],)).fetchall()
+            aptitude_rows = conn.execute("""
+                SELECT timestamp, id, username, topic, score, total_questions
+                FROM aptitude_progress WHERE id > ? ORDER BY timestamp, id
+            """, (meta['aptitude_watermark'],)).fetchall()
+
+        # One timeline: a coding attempt is folded in before the quizzes after
+        # it; one in the same second as a quiz counts as after it
+        timeline = heapq.merge(((row[0], 0, row) for row in aptitude_rows),
+                               ((row[0] or '', 1, row) for row in coding_rows))
+
+        rows = []
+        for _, is_coding, row in timeline:
+            if is_coding:
+                _, row_id, username, completed, time_spent, hints_used = row
+                meta['coding_watermark'] = max(meta['coding_watermark'], row_id)
+                coding = state['coding'].setdefault(username, [0, 0, 0, 0])
+                coding[0] += 1
+                coding[1] += 1 if completed else 0
+                coding[2] += time_spent or 0
+                coding[3] += hints_used or 0
+                continue
+
+            timestamp, row_id, username, topic, score, total = row
+            meta['aptitude_watermark'] = max(meta['aptitude_watermark'], row_id)
+            if not total:
+                continue
+            percent = score * 100.0 / total
+            user = state['users'].get(username)
+            topic_state = state['topics'].get((username, topic))
+
+            features = history_features(user, topic_state, state['coding'].get(username),
+                                        topic, parse_timestamp(timestamp), self.topics)
+            if features is not None:
+                rows.append(features + [percent])
+
+            # Fold this quiz into the running history
+            if user is None:
+                user = state['users'][username] = [0.0, 0]
+            user[0] += percent
+            user[1] += 1
+            if topic_state is None:
+                state['topics'][(username, topic)] = [percent, 1, timestamp]
+            else:
+                topic_state[0] = topic_state[0] * (1 - EWMA_ALPHA) + percent * EWMA_ALPHA
+                topic_state[1] += 1
+                topic_state[2] = timestamp
+
+        # Drop any tail left by an interrupted append, then add the new rows
+        matrix_path = self._path('training.f8')
+        with open(matrix_path, 'ab') as f:
+            f.truncate(meta['rows'] * self.width * 8)
+            if rows:
+                f.write(np.asarray(rows, dtype=np.float64).tobytes())
+        meta['rows'] += len(rows)
+
+        atomic_write(self._path('state.joblib'), lambda tmp: joblib.dump(state, tmp))
+
+        def write_meta(tmp):
+            with open(tmp, 'w') as f:
+                json.dump(meta, f)
+
+        atomic_write(self._path('meta.json'), write_meta)
+        self._state = state
+        return len(rows)
+
+    def training_data(self):
+        """Zero-copy (X, y) views over the stored rows, or (None, None) if empty"""
+        meta = self.read_meta()
+        if not meta['rows']:
+            return None, None
+        matrix = np.memmap(self._path('training.f8'), dtype=np.float64, mode='r',
+                           shape=(meta['rows'], self.width))
+        return matrix[:, :-1], matrix[:, -1]
+
+    def scoring_features(self, usernames, topics, at=None, columns=None):
+        """Current features for (user, topic) pairs from the stored state, without SQLite.
+
+        columns is the topic list of the model being scored (this store's by
+        default). Returns (features, known) where known marks users with
+        aptitude history.
+        """
+        state = self._state or self._load_state(self.read_meta())
+        at = at or datetime.utcnow()
+        columns = self.topics if columns is None else columns
+        features = np.zeros((len(usernames), len(feature_names(columns))))
+        known = np.zeros(len(usernames), dtype=bool)
+        for i, (username, topic) in enumerate(zip(usernames, topics)):
+            row = history_features(state['users'].get(username),
+                                   state['topics'].get((username, topic)),
+                                   state['coding'].get(username), topic, at, columns)
+            if row is not None:
+                features[i] = row
+                known[i] = True
+        return features, known
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._state = None
+
+
+if __name__ == '__main__':
+    store = FeatureStore()
+    if '--rebuild' in sys.argv:
+        store.clear()
+    added = store.update()
+    print(f"Appended {added} rows; store has {store.read_meta()['rows']} rows")
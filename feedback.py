@@ -0,0 +1,305 @@
+"""AI feedback on submitted solutions, computed off the request path
+
+Submitting returns a job id straight away. The model is called from an
+asyncio loop on a background thread, at most `concurrency` calls at a time
+and each bounded by `timeout`, so a slow model never holds a web worker.
+
+The job id is a hash of the problem, language and normalised code, and
+feedback_jobs doubles as the result cache: resubmitting the same solution
+returns the stored feedback, and a submission identical to one already in
+flight joins that job instead of calling the model again. Code is only
+kept in memory while its job runs.
+
+The model backend is any OpenAI-compatible chat completions endpoint
+(FEEDBACK_API_URL); benchmarks/stub_model_server.py is a local stand-in.
+It is called with httpx, so the web app needs httpx installed to run jobs.
+
+Instead of polling, clients can hold /feedback/<job_id>/events open; the
+server waits on finished(job_id) and pushes the result as one
+server-sent event.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+
+import db
+from instrumentation import Counter
+from util import PerProcess
+
+FEEDBACK_API_URL = os.environ.get('FEEDBACK_API_URL', 'https://api.openai.com/v1/chat/completions')
+FEEDBACK_API_KEY = os.environ.get('FEEDBACK_API_KEY') or os.environ.get('OPENAI_API_KEY', '')
+FEEDBACK_MODEL = os.environ.get('FEEDBACK_MODEL', 'gpt-4o-mini')
+
+MAX_CODE_CHARS = 20000
+# /feedback/<job_id>/events: comment lines keep idle proxies from closing the
+# stream, and a stream still waiting after EVENTS_TIMEOUT ends so the browser
+# reconnects (after RETRY_MS) instead of holding one connection indefinitely
+EVENTS_TIMEOUT = float(os.environ.get('FEEDBACK_EVENTS_TIMEOUT', 120))
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 2000
+EVENT_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+# Waiters on jobs another worker runs are checked this often, in one query for all of them
+POLL_SECONDS = 1.0
+# A queued/running job not touched for this long lost its worker and is retried
+STALE_SECONDS = 300
+# How long a worker waits for its job loop thread to come up
+START_TIMEOUT = 10.0
+CACHE_DAYS = 30
+FEEDBACK_EVENTS = ('submitted', 'cache_hits', 'coalesced', 'rejected', 'completed', 'failed')
+
+SYSTEM_PROMPT = (
+    "You are an interview coach reviewing a candidate's solution to the LeetCode "
+    "problem given by its slug. Comment on correctness, time and space complexity, "
+    "and concrete improvements. Be concise and use short bullet points."
+)
+
+
+def normalize_code(code):
+    """Ignore differences that do not change the solution: line endings and blank/trailing space"""
+    lines = (line.rstrip() for line in code.replace('\r\n', '\n').split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def job_id_for(problem_slug, language, code):
+    key = f"{problem_slug}\0{language.lower()}\0{normalize_code(code)}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def is_finished(job):
+    return job is None or job['status'] not in ('queued', 'running')
+
+
+def status_event(job):
+    """A job (or None for an unknown one) as a server-sent 'status' event"""
+    return f"event: status\ndata: {json.dumps(job or {'error': 'Unknown job'})}\n\n"
+
+
+class ModelBackend:
+    """OpenAI-compatible chat completions client"""
+
+    def __init__(self, url=FEEDBACK_API_URL, api_key=FEEDBACK_API_KEY, model=FEEDBACK_MODEL):
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+
+    async def review(self, http, problem_slug, language, code):
+        headers = {'Authorization': f'Bearer {self.api_key}'} if self.api_key else {}
+        response = await http.post(self.url, headers=headers, json={
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': f"Problem: {problem_slug}\nLanguage: {language}\n\n{code}"}
+            ],
+            'temperature': 0.2
+        })
+        response.raise_for_status()
+        return response.json()['choices'][0]['message']['content'].strip()
+
+
+class FeedbackService:
+    def __init__(self, backend=None, concurrency=4, timeout=60.0, max_pending=200):
+        self.backend = backend or ModelBackend()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._pending = set()
+        self._waiters = {}  # job id -> futures resolved when it stops running
+        self._watching = False
+        self._lock = threading.Lock()
+        self._ensure_started = PerProcess(self._start)
+        self._loop = None
+        self._start_error = None
+        self.counters = Counter('app_feedback_jobs', 'Feedback jobs submitted, answered and failed', ('event',))
+
+    def submit(self, conn, problem_slug, language, code):
+        """Start (or join, or answer from cache) a feedback job.
+
+        Returns the job as status() would, or None when too many jobs are pending.
+        """
+        self.counters.inc(event='submitted')
+        job_id = job_id_for(problem_slug, language, code)
+        row = conn.execute("""
+            SELECT status, feedback, error, updated_at >= datetime('now', ?)
+            FROM feedback_jobs WHERE id = ?
+        """, (f"-{STALE_SECONDS} seconds", job_id)).fetchone()
+
+        if row and row[0] == 'done':
+            self.counters.inc(event='cache_hits')
+            return self._job(job_id, row, cached=True)
+        if row and row[0] in ('queued', 'running') and (row[3] or job_id in self._pending):
+            self.counters.inc(event='coalesced')
+            return self._job(job_id, row)
+
+        # New, failed before, or orphaned by a worker that went away.
+        # Start the loop first: starting it resets this process's pending jobs.
+        self._ensure_started()
+        with self._lock:
+            if job_id in self._pending:
+                self.counters.inc(event='coalesced')
+                return {'job_id': job_id, 'status': 'queued'}
+            if len(self._pending) >= self.max_pending:
+                self.counters.inc(event='rejected')
+                return None
+            self._pending.add(job_id)
+
+        if not row:
+            # Starting a job is rare enough to double as the cache sweep
+            conn.execute("DELETE FROM feedback_jobs WHERE updated_at < datetime('now', ?)",
+                         (f"-{CACHE_DAYS} days",))
+        conn.execute("""
+            INSERT OR REPLACE INTO feedback_jobs (id, problem_slug, language, status)
+            VALUES (?, ?, ?, 'queued')
+        """, (job_id, problem_slug, language))
+        conn.commit()
+
+        asyncio.run_coroutine_threadsafe(self._run_job(job_id, problem_slug, language, code),
+                                         self._loop)
+        return {'job_id': job_id, 'status': 'queued'}
+
+    def status(self, conn, job_id):
+        """The job's current state, or None if there is no such job"""
+        row = conn.execute("""
+            SELECT status, feedback, error, updated_at >= datetime('now', ?)
+            FROM feedback_jobs WHERE id = ?
+        """, (f"-{STALE_SECONDS} seconds", job_id)).fetchone()
+        return self._job(job_id, row) if row else None
+
+    def finished(self, job_id):
+        """A concurrent.futures.Future resolved once job_id is no longer queued or running.
+
+        Take it before reading status(), so a job that finishes in between still
+        resolves it. Jobs this process runs resolve their waiters as they end;
+        for the rest one watcher polls the table every POLL_SECONDS.
+        """
+        future = Future()
+        self._ensure_started()
+        with self._lock:
+            self._waiters.setdefault(job_id, []).append(future)
+            watch = job_id not in self._pending and not self._watching
+            if watch:
+                self._watching = True
+        if watch:
+            asyncio.run_coroutine_threadsafe(self._watch(), self._loop)
+        return future
+
+    def stats(self):
+        return dict(self.counters.counts(*FEEDBACK_EVENTS), pending=len(self._pending), concurrency=self.concurrency)
+
+    @staticmethod
+    def _job(job_id, row, cached=False):
+        job = {'job_id': job_id, 'status': row[0]}
+        if row[0] == 'done':
+            job['feedback'] = row[1]
+            job['cached'] = cached
+        elif row[0] == 'failed':
+            job['error'] = row[2]
+        return job
+
+    def _start(self):
+        # A forked worker inherits neither the loop thread nor its jobs
+        with self._lock:
+            self._pending = set()
+            self._waiters = {}
+            self._watching = False
+        ready = threading.Event()
+        thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                  name='feedback-jobs', daemon=True)
+        self._start_error = None
+        thread.start()
+        if not ready.wait(START_TIMEOUT):
+            raise RuntimeError("Feedback job loop did not start")
+        error = self._start_error
+        if error is not None:
+            raise RuntimeError(f"Feedback job loop failed to start: {error!r}") from error
+
+    def _run_loop(self, ready):
+        try:
+            import httpx
+
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        except Exception as e:
+            # Handed back to _start, which raises it in the caller
+            self._start_error = e
+            ready.set()
+            return
+        ready.set()
+        self._loop.run_forever()
+
+    async def _run_job(self, job_id, problem_slug, language, code):
+        try:
+            async with self._slots:
+                await asyncio.to_thread(self._update, job_id, 'running')
+                try:
+                    feedback = await asyncio.wait_for(
+                        self.backend.review(self._http, problem_slug, language, code), self.timeout)
+                except Exception as e:
+                    self.counters.inc(event='failed')
+                    print(f"Error getting feedback for {problem_slug}: {e!r}")
+                    await asyncio.to_thread(self._update, job_id, 'failed',
+                                            error=str(e) or type(e).__name__)
+                else:
+                    self.counters.inc(event='completed')
+                    await asyncio.to_thread(self._update, job_id, 'done', feedback=feedback)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+                waiters = self._waiters.pop(job_id, ())
+            self._resolve(waiters)
+
+    async def _watch(self):
+        """Resolve waiters on jobs run by other workers, until none are left"""
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            with self._lock:
+                remote = [job_id for job_id in self._waiters if job_id not in self._pending]
+                if not remote:
+                    self._watching = False
+                    return
+            try:
+                running = await asyncio.to_thread(self._still_running, remote)
+            except Exception as e:
+                print(f"Error checking feedback jobs: {e!r}")
+                continue
+            with self._lock:
+                finished = [self._waiters.pop(job_id, ()) for job_id in remote
+                            if job_id not in running and job_id not in self._pending]
+                for job_id in running:
+                    # Drop waiters that gave up on a job that is still going
+                    waiters = [future for future in self._waiters.get(job_id, ()) if not future.done()]
+                    if waiters:
+                        self._waiters[job_id] = waiters
+                    else:
+                        self._waiters.pop(job_id, None)
+            for waiters in finished:
+                self._resolve(waiters)
+
+    @staticmethod
+    def _resolve(waiters):
+        for future in waiters:
+            # False for waiters that gave up (timed out or disconnected)
+            if future.set_running_or_notify_cancel():
+                future.set_result(None)
+
+    @staticmethod
+    def _still_running(job_ids):
+        with db.connection() as conn:
+            return {row[0] for row in conn.execute(f"""
+                SELECT id FROM feedback_jobs
+                WHERE status IN ('queued', 'running') AND id IN ({','.join('?' * len(job_ids))})
+            """, job_ids)}
+
+    @staticmethod
+    def _update(job_id, status, feedback=None, error=None):
+        with db.connection() as conn:
+            conn.execute("""
+                UPDATE feedback_jobs
+                SET status = ?, feedback = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, feedback, error, job_id))
+            conn.commit()
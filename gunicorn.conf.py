@@ -0,0 +1,72 @@
+"""gunicorn settings for both serving modes
+
+    gunicorn                                  # sync: threaded workers running app:app
+    SERVER_MODE=async gunicorn                # async: uvicorn workers running asgi:app
+    BIND=0.0.0.0:8080 WEB_CONCURRENCY=4 gunicorn
+
+sync is plain request/response serving: each worker runs THREADS requests
+at a time, and an open event stream or long poll keeps one of them busy.
+async serves asgi.py: the same views on a pool of WSGI_THREADS per worker,
+with waiting streams parked on the event loop, so a worker holds thousands
+of idle connections. One worker per CPU is enough there; sync needs spare
+workers to cover threads blocked on I/O.
+
+The master migrates the database once before forking; each worker then
+loads the question bank and renders the cached pages for itself.
+benchmarks/bench_concurrency.py compares the two modes.
+"""
+import multiprocessing
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync')
+if SERVER_MODE not in ('sync', 'async'):
+    raise ValueError(f"SERVER_MODE must be sync or async, not {SERVER_MODE!r}")
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+cpus = multiprocessing.cpu_count()
+
+if SERVER_MODE == 'async':
+    wsgi_app = 'asgi:app'
+    try:
+        import uvicorn_worker  # noqa: F401
+        worker_class = 'uvicorn_worker.UvicornWorker'
+    except ImportError:
+        # Deprecated copy of the same worker, shipped with uvicorn itself
+        worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+else:
+    wsgi_app = 'app:app'
+    worker_class = 'gthread'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1))
+    threads = int(os.environ.get('THREADS', 8))
+
+backlog = 2048
+# Connections a gthread worker accepts (open streams included) before it stops accepting
+worker_connections = 10000
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
+# Restart workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting at once
+max_requests = 5000
+max_requests_jitter = 500
+# Worker heartbeats go to a file; keep it off a disk that may stall
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = os.environ.get('ACCESS_LOG')  # '-' for stdout
+
+
+def on_starting(server):
+    import db
+    import migrations
+
+    with db.connection() as conn:
+        migrations.migrate(conn)
+    db.pool.close_all()
+
+
+def post_worker_init(worker):
+    if SERVER_MODE == 'sync':
+        # Same as `python app.py` before serving; asgi.py does it on lifespan startup
+        import app
+        app.init_db()
+        app.question_bank.load()
@@ -0,0 +1,124 @@
+"""Write-behind ingestion of coding attempts
+
+Requests only enqueue events. A background writer drains the queue and
+commits them with executemany in one transaction every FLUSH_SIZE events
+or FLUSH_INTERVAL seconds, whichever comes first, so a burst of students
+costs one fsync per batch instead of one per event. When the queue is
+full, new events are dropped and counted rather than blocking requests.
+on_flush, if given, is called with each batch once it is committed.
+"""
+import atexit
+import queue
+import threading
+import time
+
+import db
+import question_scheduler
+import user_stats
+from instrumentation import Counter
+from util import PerProcess
+
+INGEST_EVENTS = ('accepted', 'dropped', 'written', 'failed', 'flushes')
+
+
+class IngestQueue:
+    def __init__(self, flush_size=200, flush_interval=0.25, max_size=10000, on_flush=None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.on_flush = on_flush
+        self._queue = queue.Queue(maxsize=max_size)
+        self._ensure_started = PerProcess(self._start)
+        self._thread = None
+        self._stopping = threading.Event()
+        self.counters = Counter('app_ingest_queue', 'Coding attempts accepted, dropped and written', ('event',))
+
+    def submit(self, attempt):
+        """Queue one (username, topic, difficulty, time_spent, completed, hints_used, question_slug) tuple.
+
+        Returns False, and counts a drop, when the queue is full.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(attempt)
+        except queue.Full:
+            self.counters.inc(event='dropped')
+            return False
+        self.counters.inc(event='accepted')
+        return True
+
+    def stats(self):
+        return dict(self.counters.counts(*INGEST_EVENTS), queued=self._queue.qsize(), capacity=self.max_size)
+
+    def _start(self):
+        # A forked worker inherits neither the thread nor anything worth flushing
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _next_batch(self):
+        """Block for the first event, then gather more until the batch is full or due"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with db.connection() as conn:
+                user_stats.record_coding_attempts(conn, batch)
+                question_scheduler.record_attempts(conn, batch)
+                conn.commit()
+            self.counters.inc(len(batch), event='written')
+            self.counters.inc(event='flushes')
+        except Exception as e:
+            self.counters.inc(len(batch), event='failed')
+            print(f"Error writing {len(batch)} coding attempts: {e}")
+            return
+        if self.on_flush:
+            try:
+                self.on_flush(batch)
+            except Exception as e:
+                print(f"Error in ingest flush callback: {e}")
+
+    def drain(self):
+        """Synchronously write everything currently queued"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.flush_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def stop(self, timeout=5.0):
+        """Stop the writer and flush what is left (registered with atexit)"""
+        if not self._ensure_started.running():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.drain()
+        self._ensure_started.reset()
@@ -0,0 +1,137 @@
+"""Per-user cache of computed ML insights
+
+/ml-insights needs a topic recommendation, a performance prediction, a
+difficulty recommendation and aggregate stats, none of which change until
+the user finishes a quiz or logs coding attempts. Those write paths call
+invalidate(); TTL bounds staleness from anything else (a retrained model,
+another worker's writes when the in-process backend is used).
+
+Backends only need get/set/delete. MemoryBackend is an LRU local to the
+worker; RedisBackend wraps any Redis-compatible client so that all workers
+share entries and invalidations.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import Counter
+from util import redis_client
+
+DEFAULT_TTL = 300
+CACHE_EVENTS = ('hits', 'misses', 'invalidations', 'errors')
+
+
+class MemoryBackend:
+    """LRU dict with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {'backend': 'memory', 'size': len(self._entries),
+                'max_entries': self.max_entries, 'evictions': self.evictions}
+
+
+class RedisBackend:
+    """Entries stored as JSON in a Redis-compatible server; expiry is left to the server"""
+
+    def __init__(self, client, prefix='insights:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+def backend_from_url(url=None, max_entries=1024):
+    """MemoryBackend unless url points at a Redis-compatible server (needs the redis package)"""
+    client = redis_client(url, "using the in-process insights cache") if url else None
+    return RedisBackend(client) if client is not None else MemoryBackend(max_entries)
+
+
+class InsightsCache:
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.counters = Counter('app_insights_cache', 'Insights cache lookups and invalidations', ('event',))
+
+    def get_or_compute(self, username, compute):
+        """Return {'data', 'etag', 'computed_at'} for a user, calling compute() on a miss"""
+        try:
+            entry = self.backend.get(username)
+        except Exception as e:
+            self.counters.inc(event='errors')
+            print(f"Error reading insights cache: {e}")
+            entry = None
+        if entry is not None:
+            self.counters.inc(event='hits')
+            return entry
+
+        self.counters.inc(event='misses')
+        data = compute()
+        body = json.dumps([username, data], sort_keys=True, default=str)
+        entry = {
+            'data': data,
+            'etag': hashlib.sha1(body.encode()).hexdigest(),
+            'computed_at': int(time.time())
+        }
+        try:
+            self.backend.set(username, entry, self.ttl)
+        except Exception as e:
+            self.counters.inc(event='errors')
+            print(f"Error writing insights cache: {e}")
+        return entry
+
+    def invalidate(self, *usernames):
+        for username in usernames:
+            try:
+                self.backend.delete(username)
+                self.counters.inc(event='invalidations')
+            except Exception as e:
+                self.counters.inc(event='errors')
+                print(f"Error invalidating insights cache: {e}")
+
+    def stats(self):
+        counts = self.counters.counts(*CACHE_EVENTS)
+        lookups = counts['hits'] + counts['misses']
+        return dict(counts, **self.backend.stats(), ttl=self.ttl,
+                    hit_rate=round(counts['hits'] / lookups, 3) if lookups else None)
@@ -0,0 +1,409 @@
+"""Request metrics, query timing and an opt-in profiler
+
+Every request records its latency, status, number of SQL statements and
+time spent in SQLite. ML scoring and training are timed too. All of it is
+exported in the Prometheus text format (see /metrics), so one scrape per
+worker is enough to draw per-route latency percentiles.
+
+Queries are timed by a sqlite3 connection factory (TracedConnection) that
+the pool uses for new connections. Statements are recorded as written,
+with placeholders, so bound values such as passwords never reach the logs.
+record_statements() collects every distinct statement run in any thread,
+which the index check in tests/test_indexed_queries.py relies on.
+
+Requests slower than SLOW_REQUEST_MS are printed with their slowest
+queries. Sending X-Profile: <PROFILE_TOKEN> runs that request under
+cProfile and writes the stats to PROFILE_DIR; PROFILE_SAMPLE_RATE profiles
+a random fraction of all requests the same way.
+"""
+import bisect
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# Queries kept per request for the slow-request log
+MAX_TRACED_QUERIES = 200
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+    def counts(self, *defaults):
+        """A one-label counter as {label value: count}, with 0 for each of defaults not counted yet"""
+        with self._lock:
+            values = {key[0]: value for key, value in self._values.items()}
+        return dict(dict.fromkeys(defaults, 0), **values)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block took, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       _format_labels(self.labels, key, [('le', _format_value(float(bound)))]),
+                       cumulative)
+            yield self.name + '_sum', _format_labels(self.labels, key), values[-1]
+            yield self.name + '_count', _format_labels(self.labels, key), cumulative
+
+
+class Gauge:
+    """A value read when scraped; fn returns a number or {label value: number}"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.label = label
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e!r}")
+            return
+        if self.label is None:
+            yield self.name, '', value
+            return
+        for label_value, number in sorted(value.items()):
+            if isinstance(number, (int, float)) and not isinstance(number, bool):
+                yield self.name, _format_labels((self.label,), (label_value,)), number
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, fn, label=None):
+        return self.register(Gauge(name, documentation, fn, label))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'app_http_requests_total', 'Requests handled, by route, method and status',
+    ('route', 'method', 'status'))
+REQUEST_LATENCY = registry.histogram(
+    'app_http_request_duration_seconds', 'Time to produce a response, by route',
+    ('route', 'method'))
+REQUEST_QUERIES = registry.histogram(
+    'app_db_queries_per_request', 'SQL statements run by one request, by route',
+    ('route',), COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram(
+    'app_db_time_per_request_seconds', 'Time one request spent in SQLite, by route', ('route',))
+QUERY_LATENCY = registry.histogram(
+    'app_db_query_duration_seconds', 'Time of each SQL statement or commit, requests and background work',
+    buckets=QUERY_BUCKETS)
+ML_INFERENCE = registry.histogram(
+    'app_ml_inference_seconds', 'Time to score one batch, by model', ('model',))
+ML_TRAINING = registry.histogram(
+    'app_ml_training_seconds', 'Time to train a model, by model', ('model',),
+    (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+PROFILED = registry.counter('app_profiled_requests_total', 'Requests run under the profiler')
+
+
+def timed(histogram, **labels):
+    """Decorator observing each call's duration in histogram"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestTrace:
+    """Queries run while handling one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.recorded = False
+
+    def add(self, sql, elapsed):
+        self.query_count += 1
+        self.db_time += elapsed
+        if len(self.queries) < MAX_TRACED_QUERIES:
+            self.queries.append((elapsed, sql))
+
+
+_trace = contextvars.ContextVar('request_trace', default=None)
+
+# Sets filled by active record_statements() blocks
+_statement_sets = []
+
+
+@contextmanager
+def record_statements():
+    """Collect the text of every statement TracedConnection runs, from any thread, in a set"""
+    statements = set()
+    _statement_sets.append(statements)
+    try:
+        yield statements
+    finally:
+        _statement_sets.remove(statements)
+
+
+def _record_query(sql, elapsed):
+    QUERY_LATENCY.observe(elapsed)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(sql, elapsed)
+    for statements in _statement_sets:
+        statements.add(sql)
+
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every statement and commit"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() does not go through cursor(), so these are timed here too
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _record_query(script, time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record_query('COMMIT', time.perf_counter() - start)
+
+
+def _one_line(sql, limit=200):
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return sql if len(sql) <= limit else sql[:limit - 3] + '...'
+
+
+class Instrumentation:
+    def __init__(self, app=None, pool=None):
+        self.slow_request_ms = SLOW_REQUEST_MS
+        self.profile_token = PROFILE_TOKEN
+        self.profile_sample_rate = PROFILE_SAMPLE_RATE
+        self.profile_dir = PROFILE_DIR
+        self.registry = registry
+        if app is not None:
+            self.init_app(app, pool)
+
+    def init_app(self, app, pool=None):
+        if pool is not None:
+            pool.factory = TracedConnection
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def render(self):
+        return self.registry.render()
+
+    def _wants_profile(self):
+        header = request.headers.get('X-Profile')
+        if header and self.profile_token:
+            return hmac.compare_digest(header, self.profile_token)
+        return self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+
+    def _before(self):
+        trace = RequestTrace()
+        g._request_trace = trace
+        g._request_trace_token = _trace.set(trace)
+        if self._wants_profile():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return  # another profiler is already active in this process
+            g._profiler = profiler
+
+    def _after(self, response):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response.headers['X-Profile-File'] = self._save_profile(profiler)
+        self._record(response.status_code)
+        return response
+
+    def _teardown(self, exc=None):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        # after_request does not run when a view raises
+        self._record(500)
+        token = g.pop('_request_trace_token', None)
+        if token is not None:
+            try:
+                _trace.reset(token)
+            except ValueError:
+                _trace.set(None)  # torn down in a different context than it started
+
+    def _record(self, status):
+        trace = g.get('_request_trace')
+        if trace is None or trace.recorded:
+            return
+        trace.recorded = True
+        elapsed = time.perf_counter() - trace.start
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        REQUESTS.inc(route=route, method=request.method, status=str(status))
+        REQUEST_LATENCY.observe(elapsed, route=route, method=request.method)
+        REQUEST_QUERIES.observe(trace.query_count, route=route)
+        REQUEST_DB_TIME.observe(trace.db_time, route=route)
+        if elapsed * 1000 >= self.slow_request_ms:
+            self._log_slow(route, status, elapsed, trace)
+
+    def _log_slow(self, route, status, elapsed, trace):
+        lines = [f"Slow request: {request.method} {request.full_path.rstrip('?')} ({route}) -> {status} "
+                 f"in {elapsed * 1000:.0f} ms; {trace.query_count} queries took {trace.db_time * 1000:.1f} ms"]
+        for query_time, sql in sorted(trace.queries, key=lambda q: q[0], reverse=True)[:5]:
+            lines.append(f"  {query_time * 1000:8.2f} ms  {_one_line(sql)}")
+        print('\n'.join(lines))
+
+    def _save_profile(self, profiler):
+        """Write the profile where snakeviz/pstats can read it and print the top entries"""
+        PROFILED.inc()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{endpoint}.prof"
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+        print(f"Profiled {request.method} {request.path} -> {self.profile_dir}/{filename}\n"
+              f"{summary.getvalue()}")
+        return filename
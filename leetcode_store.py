@@ -0,0 +1,68 @@
+"""Local copy of LeetCode data, written by leetcode_sync.py and read by the web app
+
+The sync job replaces these files atomically; readers pick up new versions
+by mtime, so a request never waits on LeetCode itself.
+
+    questions.json  problem catalogue, same shape as leetcode_questions.json
+    daily.json      today's daily challenge
+    http_cache.json ETag/Last-Modified validators and bodies from the last sync
+"""
+import json
+import os
+import threading
+
+from util import atomic_write
+
+LEETCODE_DIR = os.environ.get('LEETCODE_DIR', 'leetcode')
+CATALOGUE_PATH = os.path.join(LEETCODE_DIR, 'questions.json')
+DAILY_PATH = os.path.join(LEETCODE_DIR, 'daily.json')
+HTTP_CACHE_PATH = os.path.join(LEETCODE_DIR, 'http_cache.json')
+
+
+def write_json(path, data):
+    """Atomically replace path with data; returns False (and writes nothing) if unchanged"""
+    body = json.dumps(data, indent=1, sort_keys=True)
+    try:
+        with open(path) as f:
+            if f.read() == body:
+                return False
+    except OSError:
+        pass
+
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            f.write(body)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    atomic_write(path, write)
+    return True
+
+
+def read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class DailyQuestion:
+    """The synced daily challenge, re-read only when the file changes"""
+
+    def __init__(self, path=DAILY_PATH):
+        self.path = path
+        self._mtime = None
+        self._question = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._question = read_json(self.path)
+                    self._mtime = mtime
+        return self._question
@@ -0,0 +1,222 @@
+"""Pull the LeetCode problem catalogue and daily challenge into leetcode_store
+
+    python leetcode_sync.py                  # catalogue + daily question
+    python leetcode_sync.py --daily-only     # e.g. hourly from cron
+    LEETCODE_GRAPHQL_URL=http://127.0.0.1:8765/graphql python leetcode_sync.py
+
+Catalogue pages are fetched concurrently (bounded by --concurrency) under a
+global request rate limit. 429s, 5xx responses and network errors are
+retried with exponential backoff, honouring Retry-After. Each request
+replays the ETag/Last-Modified of its last response, so an unchanged page
+costs a 304. The web app only ever reads the files written here.
+
+Needs httpx (pip install httpx), as do the web app's AI feedback jobs.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+import httpx
+
+import leetcode_store
+
+GRAPHQL_URL = os.environ.get('LEETCODE_GRAPHQL_URL', 'https://leetcode.com/graphql')
+
+CATALOGUE_QUERY = """
+query problemsetQuestionList($categorySlug: String, $limit: Int, $skip: Int, $filters: QuestionListFilterInput) {
+  problemsetQuestionList: questionList(categorySlug: $categorySlug, limit: $limit, skip: $skip, filters: $filters) {
+    total: totalNum
+    questions: data {
+      title
+      titleSlug
+      difficulty
+      isPaidOnly
+      topicTags { slug }
+    }
+  }
+}
+"""
+
+DAILY_QUERY = """
+query questionOfToday {
+  activeDailyCodingChallengeQuestion {
+    date
+    link
+    question {
+      title
+      titleSlug
+      difficulty
+      isPaidOnly
+      topicTags { slug }
+    }
+  }
+}
+"""
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SyncError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Spaces requests at least 1/rate seconds apart across all tasks"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class GraphQLClient:
+    def __init__(self, http, url=GRAPHQL_URL, concurrency=4, rate=4.0, retries=4, cache=None):
+        self.http = http
+        self.url = url
+        self.retries = retries
+        self.cache = cache if cache is not None else {}
+        self._slots = asyncio.Semaphore(concurrency)
+        self._limiter = RateLimiter(rate)
+        self.counters = {'requests': 0, 'not_modified': 0, 'retries': 0}
+
+    async def query(self, query, variables=None):
+        """Run one GraphQL query and return its data, reusing the cached body on a 304"""
+        payload = {'query': query, 'variables': variables or {}}
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        cached = self.cache.get(key)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.retries + 1):
+            async with self._slots:
+                await self._limiter.wait()
+                self.counters['requests'] += 1
+                try:
+                    response = await self.http.post(self.url, json=payload, headers=headers)
+                except httpx.TransportError as e:
+                    response, error = None, e
+                else:
+                    error = None
+
+            if response is not None and response.status_code == 304 and cached:
+                self.counters['not_modified'] += 1
+                return cached['data']
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                break
+            if attempt == self.retries:
+                raise SyncError(f"Giving up after {attempt + 1} attempts: "
+                                f"{error or response.status_code}")
+
+            self.counters['retries'] += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+        response.raise_for_status()
+        body = response.json()
+        if body.get('errors'):
+            raise SyncError(f"GraphQL errors: {body['errors']}")
+
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.cache[key] = {'etag': etag, 'last_modified': last_modified, 'data': body['data']}
+        return body['data']
+
+    @staticmethod
+    def _backoff(attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        return min(30, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
+def catalogue_entry(question):
+    """LeetCode's question shape -> the shape QuestionBank reads"""
+    return {
+        'title': question['title'],
+        'titleSlug': question['titleSlug'],
+        'difficulty': question['difficulty'],
+        'paidOnly': bool(question.get('isPaidOnly')),
+        'tags': [tag['slug'] for tag in question.get('topicTags') or []]
+    }
+
+
+async def fetch_catalogue(gql, page_size=100):
+    async def page(skip):
+        data = await gql.query(CATALOGUE_QUERY, {'categorySlug': '', 'skip': skip,
+                                                 'limit': page_size, 'filters': {}})
+        return data['problemsetQuestionList']
+
+    # The first page tells us how many more to fetch; the rest go out concurrently
+    first = await page(0)
+    rest = await asyncio.gather(*(page(skip) for skip in range(page_size, first['total'], page_size)))
+
+    questions = {}
+    for result in [first] + rest:
+        for question in result['questions']:
+            questions[question['titleSlug']] = catalogue_entry(question)
+    return sorted(questions.values(), key=lambda q: q['titleSlug'])
+
+
+async def fetch_daily(gql):
+    challenge = (await gql.query(DAILY_QUERY))['activeDailyCodingChallengeQuestion']
+    return dict(catalogue_entry(challenge['question']),
+                date=challenge['date'],
+                url=f"https://leetcode.com{challenge['link']}")
+
+
+async def sync(url=GRAPHQL_URL, concurrency=4, rate=4.0, page_size=100, daily_only=False):
+    """Fetch and store everything; returns a summary dict"""
+    cache = leetcode_store.read_json(leetcode_store.HTTP_CACHE_PATH, {})
+    summary = {}
+    started = time.monotonic()
+    headers = {'User-Agent': 'interview-prep-coach-sync', 'Referer': 'https://leetcode.com'}
+    async with httpx.AsyncClient(timeout=30, headers=headers) as http:
+        gql = GraphQLClient(http, url, concurrency=concurrency, rate=rate, cache=cache)
+        tasks = [fetch_daily(gql)]
+        if not daily_only:
+            tasks.append(fetch_catalogue(gql, page_size))
+        results = await asyncio.gather(*tasks)
+
+    daily = results[0]
+    summary['daily'] = daily['titleSlug']
+    summary['daily_changed'] = leetcode_store.write_json(leetcode_store.DAILY_PATH, daily)
+    if not daily_only:
+        summary['questions'] = len(results[1])
+        summary['catalogue_changed'] = leetcode_store.write_json(leetcode_store.CATALOGUE_PATH,
+                                                                 results[1])
+    leetcode_store.write_json(leetcode_store.HTTP_CACHE_PATH, gql.cache)
+    summary.update(gql.counters, seconds=round(time.monotonic() - started, 2))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=GRAPHQL_URL)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=4.0, help="max requests per second")
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--daily-only', action='store_true')
+    args = parser.parse_args()
+
+    summary = asyncio.run(sync(args.url, args.concurrency, args.rate, args.page_size,
+                               args.daily_only))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""Versioned schema migrations for interview_data.db
+
+The applied version is stored in SQLite's ``PRAGMA user_version``. Each
+migration runs in its own transaction together with the version bump, so a
+failed migration leaves the database at the previous version.
+
+    python migrations.py            # apply pending migrations
+
+table_scans() reports statements whose query plan reads a whole table;
+tests/test_indexed_queries.py runs it over every statement the app issues.
+"""
+import re
+
+import db
+
+MIGRATIONS = [
+    (1, "baseline tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            score INTEGER,
+            total_questions INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            category TEXT DEFAULT 'General',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (username) REFERENCES users (username)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS coding_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            time_spent INTEGER DEFAULT 0,
+            completed BOOLEAN DEFAULT 0,
+            hints_used INTEGER DEFAULT 0,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_learning_patterns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            session_duration INTEGER,
+            questions_attempted INTEGER,
+            topics_covered TEXT,
+            performance_score REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, "per-user secondary indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_aptitude_user_topic_time "
+        "ON aptitude_progress (username, topic, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_coding_user_topic_difficulty "
+        "ON coding_attempts (username, topic, difficulty)",
+        "CREATE INDEX IF NOT EXISTS idx_notes_user_updated "
+        "ON notes (username, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_patterns_user_time "
+        "ON user_learning_patterns (username, timestamp)",
+    ]),
+    (3, "per-user rollup tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_topic_stats (
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            ewma_score REAL,
+            last_attempt DATETIME,
+            PRIMARY KEY (username, topic)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_coding_stats (
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            time_spent_sum INTEGER NOT NULL DEFAULT 0,
+            last_attempt DATETIME,
+            PRIMARY KEY (username, topic, difficulty)
+        ) WITHOUT ROWID
+        ''',
+        # Seed from existing history; 'python user_stats.py --backfill'
+        # replays it in order for an exact EWMA
+        '''
+        INSERT OR IGNORE INTO user_topic_stats
+            (username, topic, attempts, score_sum, ewma_score, last_attempt)
+        SELECT username, topic, COUNT(*), SUM(score * 100.0 / total_questions),
+               AVG(score * 100.0 / total_questions), MAX(timestamp)
+        FROM aptitude_progress
+        WHERE total_questions > 0
+        GROUP BY username, topic
+        ''',
+        '''
+        INSERT OR IGNORE INTO user_coding_stats
+            (username, topic, difficulty, attempts, completed, time_spent_sum, last_attempt)
+        SELECT username, topic, difficulty, COUNT(*), SUM(completed != 0),
+               COALESCE(SUM(time_spent), 0), MAX(timestamp)
+        FROM coding_attempts
+        GROUP BY username, topic, difficulty
+        ''',
+    ]),
+    (4, "hints in the coding rollup", [
+        "ALTER TABLE user_coding_stats ADD COLUMN hints_used_sum INTEGER NOT NULL DEFAULT 0",
+        '''
+        UPDATE user_coding_stats SET hints_used_sum = (
+            SELECT COALESCE(SUM(hints_used), 0) FROM coding_attempts c
+            WHERE c.username = user_coding_stats.username
+              AND c.topic = user_coding_stats.topic
+              AND c.difficulty = user_coding_stats.difficulty
+        )
+        ''',
+    ]),
+    (5, "server-side quiz state", [
+        '''
+        CREATE TABLE IF NOT EXISTS quiz_sessions (
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            question_index INTEGER NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL DEFAULT 0,
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, topic)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_quiz_sessions_updated ON quiz_sessions (updated_at)",
+    ]),
+    (6, "full-text search over notes", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content,
+            content='notes', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        ''',
+        "INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')",
+        "CREATE INDEX IF NOT EXISTS idx_notes_user_category_updated "
+        "ON notes (username, category, updated_at)",
+    ]),
+    (7, "AI feedback jobs and result cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS feedback_jobs (
+            id TEXT PRIMARY KEY,
+            problem_slug TEXT NOT NULL,
+            language TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            feedback TEXT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_feedback_jobs_updated ON feedback_jobs (updated_at)",
+    ]),
+    (8, "aptitude content store", [
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_topics (
+            slug TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            formulas TEXT,
+            material TEXT,
+            source_fingerprint TEXT
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS aptitude_questions (
+            id INTEGER PRIMARY KEY,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL DEFAULT 'medium',
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            answer TEXT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_aptitude_questions_topic ON aptitude_questions (topic, difficulty)",
+        # Bumped by every import so workers know to reload their id index
+        "CREATE TABLE IF NOT EXISTS content_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO content_meta (key, value) VALUES ('version', 0)",
+        # Quizzes now remember which questions were drawn; older ones cannot be resumed
+        "ALTER TABLE quiz_sessions ADD COLUMN question_ids TEXT",
+        "DELETE FROM quiz_sessions",
+    ]),
+    (9, "per-user question scheduling", [
+        # Which LeetCode question an attempt was for, when the client knows it
+        "ALTER TABLE coding_attempts ADD COLUMN question_slug TEXT",
+        '''
+        CREATE TABLE IF NOT EXISTS question_cursors (
+            username TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, topic, difficulty)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS question_reviews (
+            username TEXT NOT NULL,
+            slug TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            box INTEGER NOT NULL DEFAULT 0,
+            due_at DATETIME NOT NULL,
+            PRIMARY KEY (username, slug)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_question_reviews_due "
+        "ON question_reviews (username, topic, difficulty, due_at)",
+    ]),
+    (10, "server-side sessions", [
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)",
+    ]),
+    (11, "note search scoped to the owner inside the FTS index", [
+        # The owner is an indexed FTS column, so a search matches the user's
+        # notes inside the index instead of every user's and then filtering.
+        # hex() keeps any username one token; the trailing digit keeps the
+        # porter stemmer off it (notes_store.owner_token builds the same).
+        "DROP TRIGGER IF EXISTS notes_fts_insert",
+        "DROP TRIGGER IF EXISTS notes_fts_delete",
+        "DROP TRIGGER IF EXISTS notes_fts_update",
+        "DROP TABLE IF EXISTS notes_fts",
+        '''
+        CREATE VIEW IF NOT EXISTS notes_fts_source AS
+        SELECT id, title, content, hex(username) || '0' AS owner FROM notes
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content, owner,
+            content='notes_fts_source', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, title, content, owner)
+            VALUES (new.id, new.title, new.content, hex(new.username) || '0');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content, owner)
+            VALUES ('delete', old.id, old.title, old.content, hex(old.username) || '0');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content, username ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content, owner)
+            VALUES ('delete', old.id, old.title, old.content, hex(old.username) || '0');
+            INSERT INTO notes_fts (rowid, title, content, owner)
+            VALUES (new.id, new.title, new.content, hex(new.username) || '0');
+        END
+        ''',
+        "INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')",
+    ]),
+]
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's schema version"""
+    version = current_version(conn)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        # Workers starting together each migrate; the write lock makes the
+        # rest wait and then find the version already bumped
+        conn.execute("BEGIN IMMEDIATE")
+        version = current_version(conn)
+        if target <= version:
+            conn.rollback()
+            continue
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
+
+
+# Statements with a query plan; schema changes, pragmas and transaction control have none
+PLANNED = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+
+
+def table_scans(conn, statements):
+    """Return (statement, plan detail) pairs for every statement that scans a table.
+
+    Statements are as written, with ? placeholders; they are planned with
+    every parameter NULL, which does not change which indexes are usable.
+    """
+    scans = []
+    for sql in statements:
+        if not PLANNED.match(sql):
+            continue
+        params = (None,) * re.sub(r"'[^']*'", "", sql).count('?')
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[-1]
+            # FTS5 lookups show up as "SCAN <t> VIRTUAL TABLE INDEX ..." but are index probes
+            if detail.startswith("SCAN ") and "VIRTUAL TABLE INDEX" not in detail:
+                scans.append((" ".join(sql.split()), detail))
+    return scans
+
+
+if __name__ == '__main__':
+    with db.connection() as conn:
+        print(f"Schema at version {migrate(conn)}")
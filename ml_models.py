@@ -0,0 +1,292 @@
+"""Machine-learning models behind /ml-insights
+
+Importing this module pulls in NumPy and scikit-learn, so the web app only
+imports it on first use (see app.load_ml).
+"""
+from datetime import datetime
+
+import numpy as np
+from sklearn.linear_model import LinearRegression, LogisticRegression
+
+import db
+import instrumentation
+from content_store import store as content_store
+from feature_store import FeatureStore, feature_layout, feature_names, history_features
+from model_store import ModelManager
+
+
+class PerformancePredictor:
+    def __init__(self):
+        self.model = LinearRegression()
+        self.is_trained = False
+        self.layout = None  # the feature_layout the model was trained on
+    
+    def prepare_training_data(self):
+        """Prepare training data from the feature store"""
+        store = FeatureStore()
+        store.update()
+        self.layout = store.layout
+        X, y = store.training_data()
+        
+        if X is None or len(X) < 5:  # Need minimum data points
+            return None, None
+        
+        return X, y
+    
+    def train_model(self):
+        """Train the model with available data"""
+        X, y = self.prepare_training_data()
+        
+        if X is None:
+            return False
+        
+        try:
+            self.model.fit(X, y)
+            self.is_trained = True
+            return True
+        except:
+            return False
+    
+    def predict_performance(self, username, topic):
+        """Predict user's performance on a topic"""
+        return self.predict_performance_batch([username], [topic])[0]
+    
+    @instrumentation.timed(instrumentation.ML_INFERENCE, model='performance')
+    def predict_performance_batch(self, usernames, topics, store=None):
+        """Predict performance for aligned lists of users and topics in one pass.
+        
+        Features come from the live rollups, or from a FeatureStore's state
+        when one is given (e.g. for offline cohort scoring).
+        """
+        usernames = list(usernames)
+        topics = list(topics)
+        
+        # Training happens offline or in the background, never in a request
+        if not self.is_trained:
+            return [None] * len(usernames)
+        
+        if store is not None:
+            features, known = store.scoring_features(usernames, topics, columns=self.layout['topics'])
+        else:
+            features, known = self.serving_features(usernames, topics)
+        
+        predictions = np.full(len(usernames), 65.0)  # Default prediction for new users
+        if known.any():
+            # Clamp predictions between 0-100
+            predictions[known] = np.clip(self.model.predict(features[known]), 0, 100)
+        
+        return predictions.tolist()
+    
+    def serving_features(self, usernames, topics):
+        """Build features for (user, topic) pairs from the per-user rollups"""
+        users = {}
+        topic_stats = {}
+        coding = {}
+        with db.connection() as conn:
+            for username, topic, ewma, attempts, score_sum, last_attempt in db.query_in_batches(conn, """
+                SELECT username, topic, ewma_score, attempts, score_sum, last_attempt
+                FROM user_topic_stats 
+                WHERE username IN ({placeholders})
+            """, usernames):
+                topic_stats[(username, topic)] = (ewma, attempts, last_attempt)
+                user = users.setdefault(username, [0.0, 0])
+                user[0] += score_sum
+                user[1] += attempts
+            
+            for username, *summary in db.query_in_batches(conn, """
+                SELECT username, SUM(attempts), SUM(completed), SUM(time_spent_sum), SUM(hints_used_sum)
+                FROM user_coding_stats 
+                WHERE username IN ({placeholders})
+                GROUP BY username
+            """, usernames):
+                coding[username] = summary
+        
+        now = datetime.utcnow()
+        columns = self.layout['topics']
+        features = np.zeros((len(usernames), len(feature_names(columns))))
+        known = np.zeros(len(usernames), dtype=bool)
+        for i, (username, topic) in enumerate(zip(usernames, topics)):
+            row = history_features(users.get(username), topic_stats.get((username, topic)),
+                                   coding.get(username), topic, now, columns)
+            if row is not None:
+                features[i] = row
+                known[i] = True
+        return features, known
+
+
+class DifficultyRecommender:
+    def __init__(self):
+        self.model = LogisticRegression()
+        self.difficulties = ['Easy', 'Medium', 'Hard']
+    
+    @instrumentation.timed(instrumentation.ML_INFERENCE, model='difficulty')
+    def recommend_difficulty_batch(self, usernames, topics):
+        """Recommend difficulties for aligned lists of users and topics in one pass"""
+        pairs = list(zip(usernames, topics))
+        position = {}
+        for i, pair in enumerate(pairs):
+            position.setdefault(pair, []).append(i)
+        
+        # NaN marks "no attempts at this difficulty"; comparisons with NaN are False
+        easy_rate = np.full(len(pairs), np.nan)
+        easy_time = np.full(len(pairs), np.nan)
+        medium_rate = np.full(len(pairs), np.nan)
+        
+        with db.connection() as conn:
+            for username, topic, diff, completed, avg_time, attempts in db.query_in_batches(conn, """
+                SELECT username, topic, difficulty, completed,
+                       time_spent_sum * 1.0 / attempts, attempts
+                FROM user_coding_stats 
+                WHERE username IN ({placeholders}) AND difficulty IN ('Easy', 'Medium')
+            """, [username for username, _ in pairs]):
+                rows = position.get((username, topic))
+                if rows is None:
+                    continue
+                success_rate = completed / attempts if attempts > 0 else 0
+                if diff == 'Easy':
+                    easy_rate[rows] = success_rate
+                    easy_time[rows] = avg_time or 1800  # Default 30 min
+                else:
+                    medium_rate[rows] = success_rate
+        
+        # Same rules as recommend_difficulty, applied to every pair at once
+        easy_mastered = (easy_rate >= 0.8) & (easy_time < 1200)  # 20 min
+        recommendations = np.where(~easy_mastered, "Easy",
+                                   np.where(medium_rate >= 0.6, "Hard", "Medium"))
+        return recommendations.tolist()
+    
+    def recommend_difficulty(self, username, topic):
+        """Recommend difficulty based on user performance"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+        
+            # Get coding attempt history from the per-difficulty rollup
+            cursor.execute("""
+                SELECT difficulty, completed, time_spent_sum * 1.0 / attempts, attempts
+                FROM user_coding_stats 
+                WHERE username = ? AND topic = ?
+            """, (username, topic))
+        
+            history = cursor.fetchall()
+        
+        if not history:
+            return "Easy"  # Start with Easy for new users
+        
+        # Calculate success rates
+        difficulty_stats = {}
+        for diff, completed, avg_time, attempts in history:
+            success_rate = completed / attempts if attempts > 0 else 0
+            difficulty_stats[diff] = {
+                'success_rate': success_rate,
+                'attempts': attempts,
+                'avg_time': avg_time or 1800  # Default 30 min
+            }
+        
+        # Simple rule-based recommendation
+        if 'Easy' in difficulty_stats:
+            easy_stats = difficulty_stats['Easy']
+            if easy_stats['success_rate'] >= 0.8 and easy_stats['avg_time'] < 1200:  # 20 min
+                if 'Medium' in difficulty_stats:
+                    medium_stats = difficulty_stats['Medium']
+                    if medium_stats['success_rate'] >= 0.6:
+                        return "Hard"
+                    else:
+                        return "Medium"
+                else:
+                    return "Medium"
+            else:
+                return "Easy"
+        
+        return "Easy"
+
+
+class TopicRecommender:
+    @property
+    def topics(self):
+        """Aptitude topics from the content store, so a topic added as content is recommended too"""
+        return content_store.titles()
+    
+    def topic_stats(self, usernames=None):
+        """Per-topic stats for many users with one rollup query per batch.
+        
+        Returns {username: {topic: stats}}. With usernames=None every user
+        is covered by a single scan, e.g. for a nightly cohort job.
+        """
+        query = """
+            SELECT username, topic,
+                   score_sum / attempts as avg_score,
+                   attempts,
+                   last_attempt
+            FROM user_topic_stats 
+            {where}
+        """
+        rows = {}
+        with db.connection() as conn:
+            if usernames is None:
+                results = conn.execute(query.format(where=""))
+            else:
+                results = db.query_in_batches(
+                    conn, query.format(where="WHERE username IN ({placeholders})"), usernames)
+            
+            for username, topic, avg_score, attempts, last_attempt in results:
+                if avg_score is None:
+                    continue
+                rows.setdefault(username, {})[topic] = {
+                    'avg_score': avg_score,
+                    'attempts': attempts,
+                    'last_attempt': last_attempt
+                }
+        
+        # Only topics that still have content, in the content store's order so ties
+        # always resolve the same way
+        topics = self.topics
+        stats = {}
+        for username, by_topic in rows.items():
+            stats[username] = {topic: by_topic[topic] for topic in topics
+                               if topic in by_topic}
+        return stats
+    
+    def pick_topic(self, topic_performance, topics=None):
+        """Choose the next topic from a user's per-topic stats"""
+        topics = self.topics if topics is None else topics
+        if not topic_performance:
+            # Start with basics
+            return "Percentages" if "Percentages" in topics or not topics else topics[0]
+        
+        # Decision tree logic
+        weak_topics = [topic for topic, stats in topic_performance.items() 
+                      if stats['avg_score'] < 70]
+        
+        if weak_topics:
+            # Recommend weakest topic
+            return min(weak_topics, 
+                      key=lambda t: topic_performance[t]['avg_score'])
+        
+        # If all topics are strong, recommend one not tried yet (e.g. newly added
+        # content), then the least practiced
+        untried = [topic for topic in topics if topic not in topic_performance]
+        if untried:
+            return untried[0]
+        return min(topic_performance.keys(), 
+                  key=lambda t: topic_performance[t]['attempts'])
+    
+    @instrumentation.timed(instrumentation.ML_INFERENCE, model='topic')
+    def suggest_next_topics(self, usernames):
+        """Suggest the next topic for each user in a cohort"""
+        stats = self.topic_stats(usernames)
+        topics = self.topics
+        return {username: self.pick_topic(stats.get(username, {}), topics)
+                for username in usernames}
+    
+    def suggest_next_topic(self, username):
+        """Suggest next topic to study"""
+        return self.suggest_next_topics([username])[username]
+
+
+# Initialize the ML models
+# The performance model is trained offline or in the background and loaded from disk
+performance_model = ModelManager('performance', PerformancePredictor,
+                                 layout=lambda: feature_layout(content_store.titles()))
+performance_model.load()
+difficulty_recommender = DifficultyRecommender()
+topic_recommender = TopicRecommender()
@@ -0,0 +1,185 @@
+"""Versioned on-disk artifacts and background retraining for ML models
+
+Artifacts are written as ``<name>-<version>.joblib`` next to a
+``<name>-latest.json`` pointer. Both are replaced atomically, so workers
+only ever load a complete artifact. Every worker reloads when the pointer
+changes, but only the worker holding the retrain lock file trains.
+
+A model records the feature layout it was trained on (the predictor's
+``layout``). One built for another layout is not loaded, and the live one
+is retrained once the current layout moves on.
+"""
+import json
+import os
+import threading
+import time
+
+import joblib
+
+import db
+import instrumentation
+from util import PerProcess, atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to training in every process
+    fcntl = None
+
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+
+
+def aptitude_watermark():
+    """Highest aptitude_progress id, i.e. how much history exists (O(1) via rowid)"""
+    with db.connection() as conn:
+        return conn.execute("SELECT MAX(id) FROM aptitude_progress").fetchone()[0] or 0
+
+
+def save_artifact(name, model, metadata, directory=MODEL_DIR):
+    """Write a versioned artifact, point <name>-latest.json at it and return its metadata"""
+    os.makedirs(directory, exist_ok=True)
+    version = time.strftime('%Y%m%d%H%M%S') + f"-{metadata.get('watermark', 0)}"
+    metadata = dict(metadata, name=name, version=version)
+    path = os.path.join(directory, f"{name}-{version}.joblib")
+
+    atomic_write(path, lambda tmp: joblib.dump({'model': model, 'metadata': metadata}, tmp))
+
+    def write_pointer(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(dict(metadata, path=os.path.basename(path)), f)
+
+    atomic_write(os.path.join(directory, f"{name}-latest.json"), write_pointer)
+    return metadata
+
+
+def load_latest(name, directory=MODEL_DIR):
+    """Load the newest artifact, memory-mapping its arrays; None if there is none"""
+    pointer = os.path.join(directory, f"{name}-latest.json")
+    try:
+        with open(pointer) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    artifact = joblib.load(os.path.join(directory, metadata['path']), mmap_mode='r')
+    return artifact['model'], artifact['metadata']
+
+
+class ModelManager:
+    """Owns the live model of one kind: loads, retrains and swaps it"""
+
+    def __init__(self, name, factory, directory=MODEL_DIR, layout=None,
+                 max_age=24 * 3600, row_threshold=100, interval=300):
+        self.name = name
+        self.factory = factory
+        self.layout = layout  # () -> the feature layout a model trained now would use
+        self.directory = directory
+        self.max_age = max_age
+        self.row_threshold = row_threshold
+        self.interval = interval
+        self.current = factory()
+        self.metadata = None
+        self._pointer_mtime = None
+        self._thread = None
+        self._started = PerProcess(self._start)
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.directory, f"{self.name}-latest.json")
+
+    def load(self):
+        """Swap in the latest artifact from disk, if it changed since the last load"""
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._pointer_mtime:
+            return False
+
+        loaded = load_latest(self.name, self.directory)
+        if loaded is None:
+            return False
+        model, metadata = loaded
+        if self.layout is not None and metadata.get('layout') != self.layout():
+            return False  # trained on another feature layout; wait for a retrain
+        predictor = self.factory()
+        predictor.model = model
+        predictor.layout = metadata.get('layout')
+        predictor.is_trained = True
+        # Rebinding the attribute is atomic; requests keep whichever model they grabbed
+        self.current = predictor
+        self.metadata = metadata
+        self._pointer_mtime = mtime
+        return True
+
+    def retrain(self):
+        """Train a fresh model, persist it and make it live"""
+        lock = self._try_lock()
+        if lock is False:
+            return False  # another worker is training; we'll pick up its artifact
+        try:
+            watermark = aptitude_watermark()
+            predictor = self.factory()
+            with instrumentation.ML_TRAINING.time(model=self.name):
+                trained = predictor.train_model()
+            if not trained:
+                return False
+            metadata = {'trained_at': time.time(), 'watermark': watermark,
+                        'layout': getattr(predictor, 'layout', None)}
+            self.metadata = save_artifact(self.name, predictor.model, metadata, self.directory)
+            self.current = predictor
+            self._pointer_mtime = os.stat(self.pointer_path).st_mtime_ns
+            return True
+        finally:
+            if lock:
+                lock.close()
+
+    def _try_lock(self):
+        if fcntl is None:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, f"{self.name}.lock"), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        return lock
+
+    def status(self):
+        """Describe the live model and whether it is due for retraining"""
+        if self.metadata is None:
+            return {'name': self.name, 'trained': False, 'stale': True,
+                    'reason': 'no trained model loaded'}
+
+        age = time.time() - self.metadata['trained_at']
+        new_rows = aptitude_watermark() - self.metadata.get('watermark', 0)
+        reasons = []
+        if age > self.max_age:
+            reasons.append(f"model is {int(age)}s old")
+        if new_rows >= self.row_threshold:
+            reasons.append(f"{new_rows} new rows since training")
+        if self.layout is not None and self.metadata.get('layout') != self.layout():
+            reasons.append("feature layout changed")
+        return {'name': self.name, 'trained': True, 'stale': bool(reasons),
+                'reason': ', '.join(reasons) or None,
+                'version': self.metadata.get('version'),
+                'age_seconds': int(age), 'new_rows': new_rows}
+
+    def _run(self):
+        while True:
+            try:
+                self.load()
+                status = self.status()
+                if status['stale']:
+                    print(f"Model '{self.name}' is stale ({status['reason']}); retraining")
+                    self.retrain()
+            except Exception as e:
+                print(f"Error refreshing model '{self.name}': {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresh thread once per process"""
+        self._started()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-refresh", daemon=True)
+        self._thread.start()
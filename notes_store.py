@@ -0,0 +1,269 @@
+"""Paged listing and full-text search over a user's notes
+
+notes_fts is an FTS5 index over notes.title/content kept in sync by
+triggers (see migrations), so create/edit/delete need no extra code. It
+also indexes each note's owner, and searches match the owner inside the
+index, so they only touch the user's own notes.
+Both listing and search use keyset cursors: a page is fetched with an
+index seek from the last row of the previous page, so deep pages cost the
+same as the first. Exports stream straight off a cursor, so memory stays
+flat however many notes a user has.
+"""
+import base64
+import json
+import re
+import zipfile
+
+from markupsafe import escape
+
+PAGE_SIZE = 30
+PREVIEW_CHARS = 150
+
+# Snippet highlight markers; swapped for <mark> after HTML-escaping the text
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from a query string; None if it is missing or malformed.
+
+    Cursors come from clients, so anything but the [sort key, id] pair that
+    encode_cursor writes is rejected rather than bound into the query.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    if any(isinstance(value, bool) or not isinstance(value, (str, int, float)) for value in values):
+        return None
+    return values
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, the last as a prefix"""
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return None
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def owner_token(username):
+    """The notes_fts owner value for a user: hex(username) || '0', as the triggers write it"""
+    return username.encode().hex() + '0'
+
+
+def user_match(username, query):
+    """An FTS5 MATCH for query over the title and content of username's notes"""
+    return f'owner:"{owner_token(username)}" AND {{title content}}: ({query})'
+
+
+def _highlight(snippet):
+    return str(escape(snippet)).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def list_page(conn, username, category=None, cursor=None, limit=PAGE_SIZE):
+    """One page of notes, newest first, with a short preview instead of the content.
+
+    Returns (notes, next_cursor); next_cursor is None on the last page.
+    """
+    sql = """
+        SELECT id, title, substr(content, 1, ?), category, created_at, updated_at
+        FROM notes
+        WHERE username = ?
+    """
+    params = [PREVIEW_CHARS + 1, username]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    after = decode_cursor(cursor)
+    if after:
+        sql += " AND (updated_at, id) < (?, ?)"
+        params.extend(after)
+    sql += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    notes = [{
+        'id': note_id,
+        'title': title,
+        'preview': preview[:PREVIEW_CHARS],
+        'truncated': len(preview) > PREVIEW_CHARS,
+        'category': note_category,
+        'created_at': created_at,
+        'updated_at': updated_at
+    } for note_id, title, preview, note_category, created_at, updated_at in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = notes[-1]
+        next_cursor = encode_cursor(last['updated_at'], last['id'])
+    return notes, next_cursor
+
+
+def search(conn, username, text, category=None, cursor=None, limit=PAGE_SIZE):
+    """Ranked search with highlighted snippets.
+
+    Returns (results, next_cursor); results are best match first.
+    """
+    query = fts_query(text)
+    if query is None:
+        return [], None
+
+    sql = """
+        WITH hits AS (
+            SELECT n.id, n.title, n.category, n.updated_at,
+                   snippet(notes_fts, -1, ?, ?, '…', 16) AS snippet,
+                   bm25(notes_fts, 5.0, 1.0, 0.0) AS rank
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH ? {category}
+        )
+        SELECT id, title, category, updated_at, snippet, rank FROM hits
+        {after}
+        ORDER BY rank, id
+        LIMIT ?
+    """
+    params = [_MARK_OPEN, _MARK_CLOSE, user_match(username, query)]
+    category_sql = after_sql = ""
+    if category:
+        category_sql = "AND n.category = ?"
+        params.append(category)
+    after = decode_cursor(cursor)
+    if after:
+        after_sql = "WHERE (rank, id) > (?, ?)"
+        params.extend(after)
+    params.append(limit + 1)
+
+    rows = conn.execute(sql.format(category=category_sql, after=after_sql), params).fetchall()
+    results = [{
+        'id': note_id,
+        'title': title,
+        'category': note_category,
+        'updated_at': updated_at,
+        'snippet': _highlight(snippet)
+    } for note_id, title, note_category, updated_at, snippet, rank in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1][5], rows[limit - 1][0])
+    return results, next_cursor
+
+
+def category_facets(conn, username, text=None):
+    """Note counts per category, for all notes or for the notes matching a search"""
+    query = fts_query(text)
+    if query is None:
+        rows = conn.execute("""
+            SELECT category, COUNT(*) FROM notes
+            WHERE username = ?
+            GROUP BY category
+        """, (username,))
+    else:
+        rows = conn.execute("""
+            SELECT n.category, COUNT(*)
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH ?
+            GROUP BY n.category
+        """, (user_match(username, query),))
+    return dict(rows.fetchall())
+
+
+def get_note(conn, username, note_id):
+    row = conn.execute("""
+        SELECT id, title, content, category, created_at, updated_at
+        FROM notes
+        WHERE id = ? AND username = ?
+    """, (note_id, username)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(('id', 'title', 'content', 'category', 'created_at', 'updated_at'), row))
+
+
+EXPORT_FIELDS = ('id', 'title', 'content', 'category', 'created_at', 'updated_at')
+EXPORT_BATCH = 200
+
+
+def iter_notes(conn, username, category=None, batch_size=EXPORT_BATCH):
+    """Yield every note as a dict, newest first, fetching batch_size rows at a time"""
+    sql = "SELECT id, title, content, category, created_at, updated_at FROM notes WHERE username = ?"
+    params = [username]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    cursor = conn.execute(sql + " ORDER BY updated_at DESC, id DESC", params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(EXPORT_FIELDS, row))
+    finally:
+        cursor.close()
+
+
+def export_ndjson(notes):
+    """One JSON object per line"""
+    for note in notes:
+        yield json.dumps(note, ensure_ascii=False) + '\n'
+
+
+class _ChunkWriter:
+    """Write-only file object for ZipFile; the zip is streamed as it is built"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _markdown_name(note):
+    slug = re.sub(r'[^\w]+', '-', note['title'].lower()).strip('-')[:60] or 'note'
+    folder = re.sub(r'[^\w ]+', '', note['category'] or 'General').strip() or 'General'
+    return f"{folder}/{note['id']}-{slug}.md"
+
+
+def _zip_time(note):
+    try:
+        return tuple(int(part) for part in re.split(r'[- :T]', note['updated_at'])[:6])
+    except (TypeError, ValueError):
+        return (1980, 1, 1, 0, 0, 0)
+
+
+def _markdown(note):
+    return (f"# {note['title']}\n\n"
+            f"*{note['category']} · updated {note['updated_at']}*\n\n"
+            f"{note['content']}\n")
+
+
+def export_markdown_zip(notes):
+    """A zip of one Markdown file per note, yielded in pieces as each note is added"""
+    out = _ChunkWriter()
+    # An unseekable target makes ZipFile write data descriptors instead of seeking back
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for note in notes:
+            info = zipfile.ZipInfo(_markdown_name(note), _zip_time(note))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, _markdown(note))
+            yield out.take()
+    yield out.take()
@@ -0,0 +1,124 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+
+@functools.lru_cache(maxsize=512)
+def shuffled(seed, size):
+    """A permutation of range(size) fixed by seed, identical in every worker"""
+    # Random(str) seeds from a hash of the string, not from hash(), so it survives restarts
+    order = list(range(size))
+    random.Random(seed).shuffle(order)
+    return order
+
+
+class QuestionBank:
+    """In-memory index of the LeetCode question bank keyed by (tag, difficulty)
+
+    Reads path, or fallback_path until path exists (e.g. before the first
+    LeetCode sync has written the full catalogue).
+    """
+
+    def __init__(self, path='leetcode_questions.json', check_interval=1.0, fallback_path=None):
+        self.path = path
+        self.fallback_path = fallback_path
+        self.check_interval = check_interval
+        self._index = {}
+        self._slugs = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _source(self):
+        """(path, mtime) of the file to read"""
+        try:
+            return self.path, os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if not self.fallback_path:
+                raise
+            return self.fallback_path, os.stat(self.fallback_path).st_mtime_ns
+
+    def load(self):
+        """Parse the question file and rebuild the (tag, difficulty) index"""
+        source = self._source()
+        with open(source[0], 'r') as f:
+            all_questions = json.load(f)
+
+        index = {}
+        slugs = {}
+        for q in all_questions:
+            # The bundled file lists some questions twice; deal() relies on each appearing once
+            if q.get("paidOnly") or q["titleSlug"] in slugs:
+                continue
+            # Build the API payload once so a request only has to pick one
+            entry = {
+                "title": q["title"],
+                "slug": q["titleSlug"],
+                "difficulty": q["difficulty"],
+                "url": f"https://leetcode.com/problems/{q['titleSlug']}/"
+            }
+            slugs[entry["slug"]] = entry
+            difficulty = q.get("difficulty", "").lower()
+            for tag in q.get("tags", []):
+                index.setdefault((tag, difficulty), []).append(entry)
+
+        # Swap the whole index at once so readers never see a partial build
+        self._index, self._slugs = index, slugs
+        self._mtime = source
+        return len(all_questions)
+
+    def reload_if_changed(self):
+        """Reload the index when the file (or which file) differs from the loaded one"""
+        now = time.monotonic()
+        if self._mtime is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        if self._source() == self._mtime:
+            return False
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            if self._source() == self._mtime:
+                return False
+            self.load()
+            return True
+
+    def questions_for(self, topic_slug, difficulty):
+        """Return the (shared, read-only) list of questions for a tag and difficulty"""
+        self.reload_if_changed()
+        return self._index.get((topic_slug, difficulty.lower()), [])
+
+    def question(self, slug):
+        """One question by slug, or None if it is not in the bank"""
+        self.reload_if_changed()
+        entry = self._slugs.get(slug)
+        return dict(entry) if entry else None
+
+    def random_question(self, topic_slug, difficulty):
+        """Pick a random question for a tag and difficulty in O(1)"""
+        pool = self.questions_for(topic_slug, difficulty)
+        if not pool:
+            return None
+        return dict(random.choice(pool))
+
+    def deal(self, topic_slug, difficulty, seed, offset, k):
+        """Up to k questions starting at offset in a shuffle of the pool fixed by seed.
+
+        Successive calls with the returned offset never repeat a question
+        until the whole pool has been dealt, then continue with a fresh
+        shuffle. Each question carries its 'position', the offset to pass
+        (plus one) for the questions after it. Returns (questions, next_offset).
+        """
+        pool = self.questions_for(topic_slug, difficulty)
+        if not pool:
+            return [], offset
+        picks = []
+        for position in range(offset, offset + min(k, len(pool))):
+            cycle, i = divmod(position, len(pool))
+            order = shuffled(f"{seed}:{topic_slug}:{difficulty.lower()}:{cycle}", len(pool))
+            picks.append(dict(pool[order[i]], position=position))
+        return picks, offset + len(picks)
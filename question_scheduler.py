@@ -0,0 +1,176 @@
+"""Per-user order of LeetCode practice questions, with spaced repetition
+
+Each (topic, difficulty) pool is shuffled once, the same way in every
+worker, and each user walks it from their own starting point. A user only
+needs one integer per pool (question_cursors.position), so a draw is a
+single upsert and nobody sees a question twice before finishing the pool,
+whichever worker serves them.
+
+Attempts tracked with a question slug feed question_reviews, a Leitner
+queue: a failed problem is due again after REVIEW_INTERVALS[0] days and
+every later success moves it to the next interval until it drops off.
+Due reviews take each draw slot with probability REVIEW_SHARE, so they
+come back without crowding out new questions.
+
+Pages that prefetch ask for upcoming(), which moves nothing, and report
+each question they display through shown(). Only displayed questions move
+the cursor or push a review back, so prefetched questions that are never
+shown stay next in line.
+"""
+import random
+import zlib
+
+from question_bank import shuffled
+
+REVIEW_INTERVALS = (1, 3, 7, 21)  # days
+REVIEW_SHARE = 0.5
+
+ADVANCE_CURSOR = """
+    INSERT INTO question_cursors (username, topic, difficulty, position) VALUES (?, ?, ?, ?)
+    ON CONFLICT (username, topic, difficulty) DO UPDATE SET position = position + excluded.position
+    RETURNING position
+"""
+
+# A displayed question moves the cursor past it, never back
+SHOW_POSITION = """
+    INSERT INTO question_cursors (username, topic, difficulty, position) VALUES (?, ?, ?, ?)
+    ON CONFLICT (username, topic, difficulty) DO UPDATE SET position = max(position, excluded.position)
+"""
+
+DUE_REVIEWS = """
+    SELECT slug, box FROM question_reviews
+    WHERE username = ? AND topic = ? AND difficulty = ? AND due_at <= CURRENT_TIMESTAMP
+    ORDER BY due_at LIMIT ?
+"""
+
+# Shown but not attempted yet: ask again after the same interval
+POSTPONE_REVIEW = """
+    UPDATE question_reviews SET due_at = datetime('now', ?)
+    WHERE username = ? AND slug = ? AND due_at <= CURRENT_TIMESTAMP
+"""
+
+SCHEDULE_REVIEW = """
+    INSERT INTO question_reviews (username, slug, topic, difficulty, box, due_at)
+    VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+    ON CONFLICT (username, slug) DO UPDATE SET
+        topic = excluded.topic,
+        difficulty = excluded.difficulty,
+        box = excluded.box,
+        due_at = excluded.due_at
+"""
+
+
+def _days(box):
+    return f"+{REVIEW_INTERVALS[box]} days"
+
+
+def record_attempts(conn, attempts):
+    """Reschedule reviews from ingested attempts (caller commits).
+
+    attempts are the ingest tuples; those without a question slug are ignored.
+    """
+    for username, topic, difficulty, _, completed, _, slug in attempts:
+        if not slug:
+            continue
+        if not completed:
+            conn.execute(SCHEDULE_REVIEW, (username, slug, topic, difficulty.lower(), 0, _days(0)))
+            continue
+        row = conn.execute("SELECT box FROM question_reviews WHERE username = ? AND slug = ?",
+                           (username, slug)).fetchone()
+        if row is None:
+            continue
+        if row[0] + 1 >= len(REVIEW_INTERVALS):
+            conn.execute("DELETE FROM question_reviews WHERE username = ? AND slug = ?", (username, slug))
+        else:
+            conn.execute(SCHEDULE_REVIEW, (username, slug, topic, difficulty.lower(),
+                                           row[0] + 1, _days(row[0] + 1)))
+
+
+class QuestionScheduler:
+    def __init__(self, bank, review_share=REVIEW_SHARE):
+        self.bank = bank
+        self.review_share = review_share
+
+    def draw(self, conn, username, topic, difficulty, k=1):
+        """Up to k questions to show now: due reviews mixed with the next unseen ones (caller commits)"""
+        pool = self.bank.questions_for(topic, difficulty)
+        if not pool:
+            return []
+        difficulty = difficulty.lower()
+        k = min(k, len(pool))
+
+        picks = self._due_reviews(conn, username, topic, difficulty, k)
+        for question in picks:
+            conn.execute(POSTPONE_REVIEW, (_days(question.pop('box')), username, question['slug']))
+
+        fresh = k - len(picks)
+        if fresh:
+            end = conn.execute(ADVANCE_CURSOR, (username, topic, difficulty, fresh)).fetchone()[0]
+            picks += self._fresh(pool, username, topic, difficulty, end - fresh, fresh, picks)
+        return picks
+
+    def upcoming(self, conn, username, topic, difficulty, k=1):
+        """The questions draw would return, without moving anything; report displayed ones to shown.
+
+        Fresh questions carry their 'position' for shown. Reviews of
+        questions gone from the catalogue are dropped (caller commits).
+        """
+        pool = self.bank.questions_for(topic, difficulty)
+        if not pool:
+            return []
+        difficulty = difficulty.lower()
+        k = min(k, len(pool))
+
+        picks = self._due_reviews(conn, username, topic, difficulty, k)
+        for question in picks:
+            del question['box']
+
+        fresh = k - len(picks)
+        if fresh:
+            row = conn.execute("""
+                SELECT position FROM question_cursors WHERE username = ? AND topic = ? AND difficulty = ?
+            """, (username, topic, difficulty)).fetchone()
+            picks += self._fresh(pool, username, topic, difficulty, row[0] if row else 0, fresh, picks)
+        return picks
+
+    def shown(self, conn, username, topic, difficulty, slug, position=None):
+        """Record that a question from upcoming was displayed (caller commits).
+
+        A fresh question (one with a position) moves the cursor past it; a
+        due review is asked again after the same interval.
+        """
+        difficulty = difficulty.lower()
+        if position is not None:
+            conn.execute(SHOW_POSITION, (username, topic, difficulty, position + 1))
+            return
+        row = conn.execute("SELECT box FROM question_reviews WHERE username = ? AND slug = ?",
+                           (username, slug)).fetchone()
+        if row is not None:
+            conn.execute(POSTPONE_REVIEW, (_days(row[0]), username, slug))
+
+    def _fresh(self, pool, username, topic, difficulty, first, count, picks):
+        """The pool's questions at cursor positions first.., skipping any already in picks"""
+        seen = {question['slug'] for question in picks}
+        order = shuffled(f"{topic}:{difficulty}", len(pool))
+        start = zlib.crc32(f"{username}:{topic}:{difficulty}".encode())
+        questions = []
+        for position in range(first, first + count):
+            question = pool[order[(start + position) % len(pool)]]
+            if question['slug'] not in seen:
+                questions.append(dict(question, position=position))
+        return questions
+
+    def _due_reviews(self, conn, username, topic, difficulty, k):
+        """Due reviews for about review_share of k slots, each with its 'box'"""
+        slots = sum(random.random() < self.review_share for _ in range(k))
+        if not slots:
+            return []
+        picks = []
+        for slug, box in conn.execute(DUE_REVIEWS, (username, topic, difficulty, slots)).fetchall():
+            question = self.bank.question(slug)
+            if question is None:
+                # Gone from the catalogue; nothing left to review
+                conn.execute("DELETE FROM question_reviews WHERE username = ? AND slug = ?", (username, slug))
+                continue
+            picks.append(dict(question, review=True, box=box))
+        return picks
@@ -0,0 +1,106 @@
+"""Server-side aptitude quiz state with per-answer scoring
+
+A user has at most one live quiz per topic, stored in quiz_sessions and
+keyed by (username, topic). A quiz is QUIZ_LENGTH questions drawn from the
+aptitude bank when it starts; their ids are stored with it. Answers carry
+the index of the question they answer and only apply while the quiz is
+still on that question, so a second tab (or a double submit) can never
+score the same question twice. Two tabs starting the same quiz at once
+both get the one that started first. Quizzes idle for longer than
+QUIZ_TTL_SECONDS are evicted.
+"""
+import json
+
+import user_stats
+
+QUIZ_TTL_SECONDS = 2 * 3600
+QUIZ_LENGTH = 10
+
+
+def _ttl():
+    return f"-{QUIZ_TTL_SECONDS} seconds"
+
+
+def _live(conn, username, topic):
+    row = conn.execute("""
+        SELECT question_ids, question_index, score FROM quiz_sessions
+        WHERE username = ? AND topic = ? AND updated_at >= datetime('now', ?)
+    """, (username, topic, _ttl())).fetchone()
+    if row is None:
+        return None
+    return {'question_ids': json.loads(row[0]), 'index': row[1], 'score': row[2]}
+
+
+def current_quiz(conn, username, topic, draw):
+    """Return the user's live quiz on a topic, starting a fresh one if needed.
+
+    draw(n) picks the question ids for a new quiz. Returns None when it
+    finds no questions.
+    """
+    quiz = _live(conn, username, topic)
+    if quiz:
+        return quiz
+
+    question_ids = draw(QUIZ_LENGTH)
+    if not question_ids:
+        return None
+
+    # Starting a quiz is rare enough to double as the sweep for idle ones
+    conn.execute("DELETE FROM quiz_sessions WHERE updated_at < datetime('now', ?)", (_ttl(),))
+    cursor = conn.execute("""
+        INSERT INTO quiz_sessions (username, topic, question_ids) VALUES (?, ?, ?)
+        ON CONFLICT (username, topic) DO NOTHING
+    """, (username, topic, json.dumps(question_ids)))
+    conn.commit()
+    if cursor.rowcount == 0:
+        # Another tab started this quiz first; play that one rather than
+        # replacing the questions its answers are graded against
+        return _live(conn, username, topic)
+    return {'question_ids': question_ids, 'index': 0, 'score': 0}
+
+
+def abandon(conn, username, topic):
+    """Drop a live quiz, e.g. when its questions were removed from the bank"""
+    conn.execute("DELETE FROM quiz_sessions WHERE username = ? AND topic = ?", (username, topic))
+    conn.commit()
+
+
+def submit_answer(conn, username, topic, index, selected):
+    """Score the answer to question `index` and advance the quiz.
+
+    Returns the new state, or None when `index` is not the current question
+    (already answered elsewhere, or the quiz expired). Finishing the quiz
+    records the result in the same transaction.
+    """
+    quiz = _live(conn, username, topic)
+    if quiz is None or quiz['index'] != index or index >= len(quiz['question_ids']):
+        return None
+
+    row = conn.execute("SELECT answer FROM aptitude_questions WHERE id = ?",
+                       (quiz['question_ids'][index],)).fetchone()
+    correct = row is not None and selected == row[0]
+    cursor = conn.execute("""
+        UPDATE quiz_sessions
+        SET question_index = question_index + 1,
+            score = score + ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE username = ? AND topic = ? AND question_index = ?
+          AND updated_at >= datetime('now', ?)
+    """, (int(correct), username, topic, index, _ttl()))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        return None
+
+    new_index, score = conn.execute("""
+        SELECT question_index, score FROM quiz_sessions WHERE username = ? AND topic = ?
+    """, (username, topic)).fetchone()
+
+    total = len(quiz['question_ids'])
+    finished = new_index >= total
+    if finished:
+        user_stats.record_aptitude_result(conn, username, topic, score, total)
+        conn.execute("DELETE FROM quiz_sessions WHERE username = ? AND topic = ?",
+                     (username, topic))
+    conn.commit()
+    return {'question_ids': quiz['question_ids'], 'index': new_index, 'score': score,
+            'total': total, 'correct': correct, 'finished': finished}
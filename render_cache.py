@@ -0,0 +1,82 @@
+"""Pre-rendered pages for content that is the same for every user
+
+Learning material, the practice topic list and the aptitude topic list only
+change on deploy, so they are rendered once per process and served as bytes
+with a strong ETag and a public Cache-Control, which lets browsers and a CDN
+absorb repeat views. They contain nothing user-specific: static/user.js
+fills in the username from /api/me (and sends logged-out visitors to the
+login page).
+
+Static files are linked through static_url(), which appends a content hash,
+so they can be cached for a year and still change on deploy.
+"""
+import hashlib
+import os
+import threading
+
+from flask import request
+
+PAGE_CACHE_CONTROL = 'public, max-age=3600, stale-while-revalidate=86400'
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class RenderCache:
+    def __init__(self, app=None):
+        self._pages = {}
+        self._static_versions = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.add_template_global(self.static_url, 'static_url')
+        app.after_request(self._cache_static)
+
+    def static_url(self, filename):
+        """URL of a static file with ?v=<content hash>, hashed once per process"""
+        version = self._static_versions.get(filename)
+        if version is None:
+            with open(os.path.join(self.app.static_folder, filename), 'rb') as f:
+                version = hashlib.sha1(f.read()).hexdigest()[:10]
+            self._static_versions[filename] = version
+        return f"{self.app.static_url_path}/{filename}?v={version}"
+
+    def _cache_static(self, response):
+        # Versioned URLs never change content, so they can be cached for good
+        if request.path.startswith(self.app.static_url_path + '/') and 'v' in request.args \
+                and response.status_code == 200:
+            response.cache_control.max_age = None
+            response.headers['Cache-Control'] = STATIC_CACHE_CONTROL
+        return response
+
+    def page(self, key, render):
+        """(body, etag) for a page, calling render() the first time"""
+        page = self._pages.get(key)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(key)
+                if page is None:
+                    body = render().encode()
+                    page = (body, hashlib.sha1(body).hexdigest())
+                    self._pages[key] = page
+        return page
+
+    def response(self, key, render):
+        """Serve a cached page, answering 304 when the client's copy is current"""
+        body, etag = self.page(key, render)
+        response = self.app.response_class(body, mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+        return response.make_conditional(request)
+
+    def clear(self):
+        """Drop every rendered page, e.g. after the content behind them changed"""
+        self._pages = {}
+
+    def warm(self, pages):
+        """Render (key, render) pairs up front so no request pays for the first render"""
+        with self.app.test_request_context():
+            for key, render in pages:
+                self.page(key, render)
+        return len(self._pages)
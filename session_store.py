@@ -0,0 +1,200 @@
+"""Server-side sessions: the cookie holds only an opaque id
+
+Session data lives in a backend (the sessions table by default, or a
+Redis-compatible server with SESSION_STORE_URL=redis://...), so cookies
+stay a fixed ~50 bytes however much a session holds, and nothing is
+signed or re-serialised on requests that don't use the session.
+
+The data is only loaded when a view first touches the session, and only
+written back when it changed, is new, or is past half its lifetime (so
+active sessions slide forward). Emptying a session deletes it. Call
+rotate() after a login to move the data to a fresh id.
+"""
+import secrets
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+import db
+from instrumentation import Counter
+from util import redis_client
+
+serializer = TaggedJSONSerializer()
+
+SESSION_EVENTS = ('loads', 'writes', 'unchanged', 'deletes')
+
+
+class SQLiteBackend:
+    """Sessions in the sessions table; expired rows are swept every sweep_interval seconds"""
+
+    def __init__(self, sweep_interval=300):
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+
+    def load(self, sid):
+        with db.connection() as conn:
+            row = conn.execute("SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                               (sid, int(time.time()))).fetchone()
+        return (serializer.loads(row[0]), row[1]) if row else None
+
+    def save(self, sid, data, ttl):
+        now = int(time.time())
+        with db.connection() as conn:
+            # The request's own uncommitted work would be rolled back on release anyway
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                         (sid, serializer.dumps(data), now + ttl))
+            if now - self._last_sweep > self.sweep_interval:
+                self._last_sweep = now
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            conn.commit()
+        return now + ttl
+
+    def delete(self, sid):
+        with db.connection() as conn:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+            conn.commit()
+
+    def stats(self):
+        return {'backend': 'sqlite'}
+
+
+class RedisBackend:
+    """Sessions as keys with a TTL in a Redis-compatible server; expiry is left to the server"""
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, sid):
+        raw, ttl = self.client.pipeline().get(self.prefix + sid).ttl(self.prefix + sid).execute()
+        if raw is None:
+            return None
+        return serializer.loads(raw), int(time.time()) + max(ttl, 0)
+
+    def save(self, sid, data, ttl):
+        self.client.setex(self.prefix + sid, ttl, serializer.dumps(data))
+        return int(time.time()) + ttl
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+def backend_from_url(url=None):
+    """SQLiteBackend unless url points at a Redis-compatible server (needs the redis package)"""
+    client = redis_client(url, "storing sessions in SQLite") if url and url != 'sqlite' else None
+    return RedisBackend(client) if client is not None else SQLiteBackend()
+
+
+class ServerSession(SessionMixin):
+    def __init__(self, sid, loader):
+        self.sid = sid
+        self.expires_at = None
+        self.modified = False
+        self.accessed = False
+        self.rotated_from = None
+        self._loader = loader
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            record = self._loader(self.sid) if self.sid else None
+            if record is None:
+                self.sid = None  # unknown or expired id: start afresh
+                self._data = {}
+            else:
+                self._data, self.expires_at = record
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def rotate(self):
+        """Give the session a new id (e.g. after login) so a planted id can't be reused"""
+        self._load()
+        if self.sid is not None:
+            self.rotated_from = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = Counter('app_sessions', 'Session loads, writes, skipped writes and deletes', ('event',))
+
+    def _load(self, sid):
+        self.counters.inc(event='loads')
+        return self.backend.load(sid)
+
+    def open_session(self, app, request):
+        return ServerSession(request.cookies.get(self.get_cookie_name(app)) or None, self._load)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.loaded:
+            return
+
+        if session.rotated_from:
+            self.backend.delete(session.rotated_from)
+        if not session:
+            if session.sid is not None or session.rotated_from:
+                if session.sid is not None:
+                    self.backend.delete(session.sid)
+                self.counters.inc(event='deletes')
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        due = session.expires_at is not None and session.expires_at - time.time() < ttl / 2
+        if session.sid is not None and not session.modified and not due:
+            self.counters.inc(event='unchanged')
+            return
+
+        is_new = session.sid is None
+        if is_new:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires_at = self.backend.save(session.sid, dict(session), ttl)
+        self.counters.inc(event='writes')
+        if is_new:
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+    def stats(self):
+        return dict(self.counters.counts(*SESSION_EVENTS), **self.backend.stats())
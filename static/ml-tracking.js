@@ -1,26 +1,66 @@
 // Track coding practice sessions
-function trackCodingSession(topic, difficulty, timeSpent, completed) {
-    fetch('/track-coding-attempt', {
+// Events are buffered and sent in batches to /track-coding-attempts, using
+// navigator.sendBeacon so the last batch still goes out when the page closes.
+const TRACKING_ENDPOINT = '/track-coding-attempts';
+const TRACKING_BATCH_SIZE = 20;
+const TRACKING_FLUSH_MS = 5000;
+
+let pendingEvents = [];
+let flushTimer = null;
+
+function flushCodingSessions() {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    if (pendingEvents.length === 0) return;
+
+    const body = JSON.stringify({ events: pendingEvents });
+    pendingEvents = [];
+
+    const blob = new Blob([body], { type: 'application/json' });
+    if (navigator.sendBeacon && navigator.sendBeacon(TRACKING_ENDPOINT, blob)) return;
+
+    // Fall back to fetch (keepalive lets it outlive the page too)
+    fetch(TRACKING_ENDPOINT, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-            topic: topic,
-            difficulty: difficulty,
-            time_spent: timeSpent,
-            completed: completed
-        })
+        body: body,
+        keepalive: true
     }).then(response => response.json())
-      .then(data => console.log('Session tracked:', data));
+      .then(data => console.log('Sessions tracked:', data));
 }
 
+// slug (the LeetCode question) and hintsUsed are optional
+function trackCodingSession(topic, difficulty, timeSpent, completed, slug, hintsUsed) {
+    pendingEvents.push({
+        topic: topic,
+        difficulty: difficulty,
+        time_spent: timeSpent,
+        completed: completed,
+        slug: slug || null,
+        hints_used: hintsUsed || 0
+    });
+
+    if (pendingEvents.length >= TRACKING_BATCH_SIZE) {
+        flushCodingSessions();
+    } else if (!flushTimer) {
+        flushTimer = setTimeout(flushCodingSessions, TRACKING_FLUSH_MS);
+    }
+}
+
+// Send whatever is buffered when the user leaves or hides the page
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushCodingSessions();
+});
+window.addEventListener('pagehide', flushCodingSessions);
+
 // Add to your practice.html template
 let sessionStartTime = Date.now();
 
 // Call this when user completes a problem
-function onProblemComplete(topic, difficulty, success) {
+function onProblemComplete(topic, difficulty, success, slug) {
     const timeSpent = Math.floor((Date.now() - sessionStartTime) / 1000);
-    trackCodingSession(topic, difficulty, timeSpent, success);
+    trackCodingSession(topic, difficulty, timeSpent, success, slug);
     sessionStartTime = Date.now(); // Reset for next problem
 }
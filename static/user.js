@@ -0,0 +1,18 @@
+// Personalise pages that are cached for every user (see render_cache.py)
+// Fills [data-username] from /api/me, or sends logged-out visitors to log in.
+// Pages that keep per-user state can listen for the 'user:loaded' event.
+fetch('/api/me', { credentials: 'same-origin' })
+    .then(response => {
+        if (response.status === 401) {
+            window.location = '/login';
+            return null;
+        }
+        return response.json();
+    })
+    .then(me => {
+        if (!me) return;
+        document.querySelectorAll('[data-username]').forEach(el => {
+            el.textContent = me.username;
+        });
+        document.dispatchEvent(new CustomEvent('user:loaded', { detail: me }));
+    });
@@ -0,0 +1,22 @@
+"""Every test module shares one app import, on a scratch database and directories
+
+app.py and the stores read their paths from the environment when they are
+first imported, so the scratch paths are set here, before any test module
+imports them.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+WORKDIR = tempfile.mkdtemp()
+os.environ.update(INTERVIEW_DB=os.path.join(WORKDIR, 'test.db'),
+                  MODEL_DIR=os.path.join(WORKDIR, 'models'),
+                  FEATURE_DIR=os.path.join(WORKDIR, 'features'),
+                  LEETCODE_DIR=os.path.join(WORKDIR, 'leetcode'),
+                  FEEDBACK_API_URL='http://127.0.0.1:9/v1/chat/completions',
+                  FEEDBACK_EVENTS_TIMEOUT='5')
+os.chdir(ROOT)
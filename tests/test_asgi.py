@@ -0,0 +1,49 @@
+"""The ASGI bridge hands requests to the Flask views as a WSGI server would"""
+import asyncio
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def asgi():
+    import asgi
+
+    asgi.web.init_db()
+    return asgi
+
+
+def call(app, path, headers=()):
+    """One GET through the ASGI app; returns (status, body)"""
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+             'headers': list(headers), 'http_version': '1.1'}
+    messages = []
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {'type': 'http.request', 'body': b''}
+        await asyncio.Event().wait()  # the client stays connected
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def test_repeated_cookie_headers(asgi):
+    client = asgi.web.app.test_client()
+    client.post('/register', data={'username': 'cookies', 'email': 'cookies@example.com',
+                                   'password': 'pw', 'confirm_password': 'pw'})
+    client.post('/login', data={'username': 'cookies', 'password': 'pw'})
+    sid = client.get_cookie('session').value
+
+    environ = asgi.wsgi_environ({'method': 'GET', 'path': '/', 'query_string': b'', 'http_version': '1.1',
+                                 'headers': [(b'cookie', b'theme=dark'), (b'cookie', f'session={sid}'.encode()),
+                                             (b'accept', b'text/html'), (b'accept', b'*/*')]}, b'')
+    assert environ['HTTP_COOKIE'] == f'theme=dark; session={sid}'
+    assert environ['HTTP_ACCEPT'] == 'text/html,*/*'
+
+    status, _ = call(asgi.app, '/api/notes', [(b'cookie', b'theme=dark'), (b'cookie', f'session={sid}'.encode())])
+    assert status == 200
@@ -0,0 +1,118 @@
+"""No statement the app runs may scan a whole table
+
+The app is driven through its test client over a seeded scratch database:
+bench_routes.py's route mix, then the routes and background work the mix
+leaves out. Every statement TracedConnection runs meanwhile is recorded
+(instrumentation.record_statements), so a new query is checked as soon as
+something runs it, without being listed here.
+
+    python -m pytest tests/test_indexed_queries.py
+"""
+import json
+import random
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    """The app module on conftest.py's scratch database, and how many users were seeded"""
+    import app as web
+    import bench_routes
+
+    web.init_db()
+    web.question_bank.load()
+    with web.db.connection() as conn:
+        users = bench_routes.seed(conn, 2000, random.Random(3))['users']
+    return web, users
+
+
+def ok(response, status=200):
+    """The response, once its status is the expected one: a route that fails runs less SQL than it should"""
+    assert response.status_code == status, \
+        f"{response.request.method} {response.request.full_path}: {response.status_code}"
+    return response
+
+
+def drive(web, users):
+    """Every route, with the parameters that change its SQL, plus the background jobs"""
+    import bench_routes
+
+    samples, _ = bench_routes.run(web.app, 'client', 2, 150, users, 3)
+    failed = sorted(name for name, values in samples.items() if any(error for _, error in values))
+    assert not failed, f"route mix errors: {failed}"
+
+    client = web.app.test_client()
+    ok(client.post('/register', data={'username': 'tester', 'email': 'tester@example.com',
+                                      'password': 'pw', 'confirm_password': 'pw'}), 302)
+    ok(client.post('/login', data={'username': 'tester', 'password': 'wrong'}), 302)
+    ok(client.post('/login', data={'username': 'nobody', 'password': 'pw'}), 302)
+    ok(client.post('/login', data={'username': 'tester', 'password': 'pw'}), 302)
+
+    for i in range(3):
+        ok(client.post('/notes/create', data={'title': f'Graph note {i}', 'content': 'bfs and dfs',
+                                              'category': 'DSA'}), 302)
+    notes = ok(client.get('/api/notes?limit=1')).get_json()
+    note_id = notes['notes'][0]['id']
+    ok(client.get(f"/api/notes?limit=1&category=DSA&cursor={notes['next_cursor']}"))
+    ok(client.get(f"/notes?category=DSA&cursor={notes['next_cursor']}"))
+    results = ok(client.get('/notes/search?q=graph&limit=1')).get_json()
+    ok(client.get(f"/notes/search?q=graph&category=DSA&limit=1&cursor={results['next_cursor']}"))
+    ok(client.get('/notes/export?format=markdown')).get_data()
+    ok(client.get('/notes/export?category=DSA')).get_data()
+    ok(client.get(f'/api/notes/{note_id}'))
+    ok(client.post(f'/notes/edit/{note_id}', data={'title': 'Trees', 'content': 'dfs', 'category': 'DSA'}),
+       302)
+    ok(client.get(f'/notes/delete/{note_id}'), 302)
+
+    step = ok(client.get('/api/quiz/percentages')).get_json()
+    while 'index' in step:
+        step = ok(client.post('/api/quiz/percentages/answer',
+                              json={'index': step['index'], 'answer': '50'})).get_json()
+    ok(client.get('/solve/time-and-work'))
+    ok(client.post('/solve/time-and-work', data={'index': 0, 'answer': '1'}))
+
+    pair = {'topic': 'array', 'difficulty': 'Easy'}
+    questions = ok(client.post('/get-dynamic-questions', json={'pairs': [pair], 'k': 3})).get_json()
+    first = questions['questions']['array:Easy'][0]
+    ok(client.post('/practice/shown', json=dict(pair, slug=first['slug'], position=first['position'])), 204)
+    ok(client.post('/track-coding-attempts', data=json.dumps({'events': [
+        dict(pair, slug=first['slug'], completed=completed, time_spent=60) for completed in (False, True)]})),
+       202)
+    web.ingest_queue.drain()
+    with web.db.connection() as conn:
+        conn.execute("UPDATE question_reviews SET due_at = datetime('now', '-1 day') WHERE username = ?",
+                     ('tester',))
+        conn.commit()
+    web.question_scheduler.review_share = 1.0
+    ok(client.get('/get-dynamic-question?topic=array&difficulty=Easy'))
+    ok(client.post('/practice/shown', json=dict(pair, slug=first['slug'])), 204)
+
+    job = ok(client.post('/feedback', json={'problem_slug': 'two-sum', 'code': 'print(1)'}), 202).get_json()
+    ok(client.get(f"/feedback/{job['job_id']}/events")).get_data()
+    ok(client.get(f"/feedback/{job['job_id']}"))
+    ok(client.post('/feedback', json={'problem_slug': 'two-sum', 'code': 'print(1)'}), 202)
+    # A job another worker ran: the watcher polls the table for it
+    with web.db.connection() as conn:
+        conn.execute("INSERT INTO feedback_jobs (id, problem_slug, language, status) "
+                     "VALUES ('remote', 'two-sum', 'python', 'done')")
+        conn.commit()
+    web.feedback_service.finished('remote').result(10)
+    for path in ('/ml-insights', '/ml-insights/cache-stats', '/ml-insights/model-status',
+                 '/feedback/stats', '/metrics'):
+        ok(client.get(path))
+    ok(client.get('/logout'), 302)
+
+    web.load_ml().performance_model.retrain()
+
+
+def test_no_table_scans(seeded):
+    import instrumentation
+    import migrations
+
+    web, users = seeded
+    with instrumentation.record_statements() as statements:
+        drive(web, users)
+    with web.db.connection() as conn:
+        scans = migrations.table_scans(conn, statements)
+    assert not scans, "\n".join(f"{detail}: {sql}" for sql, detail in scans)
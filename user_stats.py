@@ -0,0 +1,148 @@
+"""Incrementally maintained per-user rollups of quiz and coding history
+
+user_topic_stats and user_coding_stats are updated in the same transaction
+as the raw INSERT, so reads cost one indexed row per topic no matter how
+long a user's history is.
+
+    python user_stats.py --backfill   # rebuild both rollups from raw rows
+"""
+import sys
+
+import db
+
+# Weight of the newest quiz in the exponentially weighted average
+EWMA_ALPHA = 0.3
+
+UPSERT_TOPIC_STATS = """
+    INSERT INTO user_topic_stats (username, topic, attempts, score_sum, ewma_score, last_attempt)
+    VALUES (?, ?, 1, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (username, topic) DO UPDATE SET
+        attempts = attempts + 1,
+        score_sum = score_sum + excluded.score_sum,
+        ewma_score = ewma_score * (1 - ?) + excluded.ewma_score * ?,
+        last_attempt = excluded.last_attempt
+"""
+
+UPSERT_CODING_STATS = """
+    INSERT INTO user_coding_stats (username, topic, difficulty, attempts, completed,
+                                   time_spent_sum, hints_used_sum, last_attempt)
+    VALUES (?, ?, ?, 1, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (username, topic, difficulty) DO UPDATE SET
+        attempts = attempts + 1,
+        completed = completed + excluded.completed,
+        time_spent_sum = time_spent_sum + excluded.time_spent_sum,
+        hints_used_sum = hints_used_sum + excluded.hints_used_sum,
+        last_attempt = excluded.last_attempt
+"""
+
+
+def record_aptitude_result(conn, username, topic, score, total_questions):
+    """Insert a quiz result and fold it into user_topic_stats (caller commits)"""
+    conn.execute("""
+        INSERT INTO aptitude_progress (username, topic, score, total_questions)
+        VALUES (?, ?, ?, ?)
+    """, (username, topic, score, total_questions))
+
+    if total_questions:
+        percent = score * 100.0 / total_questions
+        conn.execute(UPSERT_TOPIC_STATS,
+                     (username, topic, percent, percent, EWMA_ALPHA, EWMA_ALPHA))
+
+
+def record_coding_attempt(conn, username, topic, difficulty, time_spent, completed, hints_used=0,
+                          question_slug=None):
+    """Insert a coding attempt and fold it into user_coding_stats (caller commits)"""
+    completed = 1 if completed else 0
+    conn.execute("""
+        INSERT INTO coding_attempts (username, topic, difficulty, time_spent, completed, hints_used,
+                                     question_slug)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (username, topic, difficulty, time_spent, completed, hints_used, question_slug))
+    conn.execute(UPSERT_CODING_STATS,
+                 (username, topic, difficulty, completed, time_spent or 0, hints_used or 0))
+
+
+def record_coding_attempts(conn, attempts):
+    """Bulk version of record_coding_attempt for write-behind ingestion (caller commits).
+
+    attempts is a list of (username, topic, difficulty, time_spent, completed, hints_used,
+    question_slug); question_slug may be None.
+    """
+    rows = [(username, topic, difficulty, time_spent or 0, 1 if completed else 0, hints_used or 0, slug)
+            for username, topic, difficulty, time_spent, completed, hints_used, slug in attempts]
+    conn.executemany("""
+        INSERT INTO coding_attempts (username, topic, difficulty, time_spent, completed, hints_used,
+                                     question_slug)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.executemany(UPSERT_CODING_STATS,
+                     [(username, topic, difficulty, completed, time_spent, hints_used)
+                      for username, topic, difficulty, time_spent, completed, hints_used, _ in rows])
+
+
+def user_totals(conn, username):
+    """Return (attempts, average percentage) across all topics for a user"""
+    return conn.execute("""
+        SELECT SUM(attempts) as total_attempts,
+               SUM(score_sum) / SUM(attempts) as avg_performance
+        FROM user_topic_stats
+        WHERE username = ?
+    """, (username,)).fetchone()
+
+
+def backfill(conn):
+    """Rebuild both rollups from aptitude_progress and coding_attempts"""
+    conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM user_topic_stats")
+        conn.execute("DELETE FROM user_coding_stats")
+
+        # The EWMA depends on order, so replay each user's quizzes chronologically
+        rows = conn.execute("""
+            SELECT username, topic, score * 100.0 / total_questions, timestamp
+            FROM aptitude_progress
+            WHERE total_questions > 0
+            ORDER BY username, topic, timestamp, id
+        """)
+        stats = {}
+        for username, topic, percent, timestamp in rows:
+            key = (username, topic)
+            if key not in stats:
+                stats[key] = [0, 0.0, percent, timestamp]
+            entry = stats[key]
+            entry[0] += 1
+            entry[1] += percent
+            if entry[0] > 1:
+                entry[2] = entry[2] * (1 - EWMA_ALPHA) + percent * EWMA_ALPHA
+            entry[3] = timestamp
+
+        conn.executemany("""
+            INSERT INTO user_topic_stats (username, topic, attempts, score_sum, ewma_score, last_attempt)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [key + tuple(entry) for key, entry in stats.items()])
+
+        conn.execute("""
+            INSERT INTO user_coding_stats (username, topic, difficulty, attempts, completed,
+                                           time_spent_sum, hints_used_sum, last_attempt)
+            SELECT username, topic, difficulty, COUNT(*), SUM(completed != 0),
+                   COALESCE(SUM(time_spent), 0), COALESCE(SUM(hints_used), 0), MAX(timestamp)
+            FROM coding_attempts
+            GROUP BY username, topic, difficulty
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(stats)
+
+
+if __name__ == '__main__':
+    if '--backfill' not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+
+    import migrations
+
+    with db.connection() as conn:
+        migrations.migrate(conn)
+        print(f"Rebuilt stats for {backfill(conn)} user/topic pairs")
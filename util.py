@@ -0,0 +1,62 @@
+"""Helpers shared by the stores and the background services"""
+import os
+import threading
+
+
+def redis_client(url, fallback):
+    """A client for the Redis-compatible server at url, or None without the redis package.
+
+    fallback says what the caller does instead; it is printed with the warning.
+    """
+    try:
+        import redis
+    except ImportError:
+        print(f"redis package not installed; {fallback}")
+        return None
+    return redis.Redis.from_url(url)
+
+
+def atomic_write(path, write):
+    """Call write(tmp) to fill a temporary file, then move it over path in one step.
+
+    Readers see the old file or the new one, never a partial write.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class PerProcess:
+    """Runs start() once in each process, on first call from any thread.
+
+    Threads, pools and event loops do not survive a fork, so a forked
+    worker starts its own. If start() raises, the next call tries again.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+                self._pid = os.getpid()
+
+    def running(self):
+        """Whether start() has run in this process"""
+        return self._pid == os.getpid()
+
+    def reset(self):
+        """Make the next call start again"""
+        self._pid = None